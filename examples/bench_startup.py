@@ -0,0 +1,46 @@
+if __name__ == '__main__':
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from time import perf_counter
+
+    from pino.config import Config
+
+    # time to import `pino.ino` and whether pyserial is loaded by it
+    code = "import sys, pino.ino; print('serial' in sys.modules)"
+    n_runs = 10
+    start = perf_counter()
+    for _ in range(n_runs):
+        out = subprocess.check_output([sys.executable, "-c", code])
+    elapsed = (perf_counter() - start) / n_runs
+    print(f"import pino.ino: {elapsed * 1e3:.1f} ms / process "
+          f"(pyserial imported: {out.decode().strip()})")
+
+    # time to load many experiment files, as `PinoCli.get_configs` does
+    sample = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "sample.yaml")
+    with open(sample) as f:
+        text = f.read()
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["PINO_CACHE_DIR"] = os.path.join(d, "cache")
+        paths = []
+        for i in range(50):
+            path = os.path.join(d, f"exp{i}.yaml")
+            with open(path, "w") as f:
+                f.write(text)
+            paths.append(path)
+
+        def load(cache: bool) -> float:
+            start = perf_counter()
+            for path in paths:
+                config = Config(path, cache=cache)
+                config.comport
+                config.pinmode
+            return perf_counter() - start
+
+        uncached = load(False)
+        load(True)  # fill the cache
+        cached = load(True)
+        print(f"{len(paths)} configs without cache: {uncached * 1e3:.1f} ms")
+        print(f"{len(paths)} configs with cache:    {cached * 1e3:.1f} ms")
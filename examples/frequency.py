@@ -0,0 +1,30 @@
+if __name__ == '__main__':
+    from pino.ino import COUNTER, Arduino, Comport
+    from pino.measurement import EdgeCount, PulseCapture
+
+    com = Comport() \
+        .set_port("/dev/ttyACM0") \
+        .set_baudrate(115200) \
+        .set_timeout(1.) \
+        .set_warmup(2.) \
+        .deploy() \
+        .connect()
+
+    ino = Arduino(com)
+
+    FLOW_METER = 2
+    ino.set_pinmode(FLOW_METER, COUNTER)
+    ino.set_count_window(500)
+
+    # period and pulse width of the signal on pin 8
+    ino.start_capture(10)
+
+    for _ in range(20):
+        m = ino.read_measurement()
+        if isinstance(m, EdgeCount):
+            print(f"pin {m.pin}: {m.frequency:.1f} Hz")
+        elif isinstance(m, PulseCapture):
+            print(f"pin 8: {m.frequency:.3f} Hz, width {m.width * 1e6:.2f} us")
+
+    ino.stop_capture()
+    ino.set_count_window(0)
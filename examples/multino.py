@@ -1,6 +1,7 @@
 if __name__ == '__main__':
     from time import sleep
 
+    from pino.group import BoardGroup
     from pino.ino import HIGH, LOW, OUTPUT, Arduino, Comport
 
     com1 = Comport() \
@@ -36,3 +37,15 @@ if __name__ == '__main__':
         sleep(1)
 
     ino2.digital_write(LED_BUILTIN, LOW)
+
+    # turn on both LEDs at the same time
+    group = BoardGroup([ino1, ino2])
+    group.sync_clocks()
+    for _ in range(10):
+        group.write_at(LED_BUILTIN, HIGH)
+        print(f"skew: {group.collect().skew}")
+        sleep(1)
+        group.write_at(LED_BUILTIN, LOW)
+        print(f"skew: {group.collect().skew}")
+        sleep(1)
+    group.close()
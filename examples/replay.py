@@ -0,0 +1,29 @@
+if __name__ == '__main__':
+    from time import sleep
+
+    from pino.ino import HIGH, LOW, OUTPUT, Arduino, Comport
+    from pino.trace import Replayer, TraceWriter
+
+    com = Comport() \
+        .set_port("/dev/ttyACM0") \
+        .set_baudrate(115200) \
+        .set_timeout(1.) \
+        .set_warmup(2.) \
+        .deploy() \
+        .connect()
+
+    LED_BUILTIN = 13
+
+    # record the traffic of a session
+    with TraceWriter("session.trc") as trace:
+        ino = Arduino(com, capture=trace)
+        ino.set_pinmode(LED_BUILTIN, OUTPUT)
+        for _ in range(10):
+            ino.digital_write(LED_BUILTIN, HIGH)
+            sleep(0.1)
+            ino.digital_write(LED_BUILTIN, LOW)
+            sleep(0.1)
+
+    # issue the same commands twice as fast as recorded
+    report = Replayer("session.trc").replay(com.connection, speed=2.)
+    print(report.summary())
@@ -0,0 +1,192 @@
+from collections import deque
+from math import sqrt
+from time import perf_counter, time
+from typing import TYPE_CHECKING, Callable, Deque, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pino.ino import Arduino
+
+# `micros()` of the board wraps around every 2^32 us (about 71.6 min)
+WRAP = 1 << 32
+
+
+class ClockSync(object):
+    """Relate board time (`micros()`) to host time
+
+    Each synchronization sends a burst of pings and keeps the sample with
+    the minimum round trip time, whose midpoint is the closest estimate of
+    when the board read its clock. Offset and drift are fitted by least
+    squares over the latest samples.
+
+    The fit uses a monotonic host clock, so that steps of the wall clock
+    (e.g. by NTP) do not corrupt it. Host times are converted to and from
+    wall-clock time by an offset measured at the latest synchronization.
+
+    Synchronization runs only when `sync` or `poll` is called; call
+    `poll` periodically (e.g. between reads) to follow drift.
+    """
+    def __init__(self,
+                 ino: 'Arduino',
+                 interval: float = 10.,
+                 burst: int = 8,
+                 window: int = 32,
+                 clock: Callable[[], float] = perf_counter,
+                 wall: Callable[[], float] = time):
+        """Instantiate ClockSync
+
+        Parameters
+        ----------
+        ino: Arduino
+            Board to synchronize with.
+        interval: float = 10.
+            Interval (sec) between synchronizations in `poll`.
+        burst: int = 8
+            Number of pings in a synchronization.
+        window: int = 32
+            Number of samples used for fitting.
+        clock: Callable[[], float] = perf_counter
+            Monotonic host clock (sec) used for fitting.
+        wall: Callable[[], float] = time
+            Wall clock (sec) in which host times are given and returned.
+        """
+        self.__ino = ino
+        self.__interval = interval
+        self.__burst = burst
+        self.__clock = clock
+        self.__wall = wall
+        # wall clock minus monotonic clock
+        self.__wall_offset = wall() - clock()
+        # (board time (us, unwrapped), host time (sec), round trip (sec))
+        self.__samples: Deque[Tuple[int, float, float]] = deque(maxlen=window)
+        self.__last: Optional[int] = None
+        self.__last_sync = float("-inf")
+        self.__fit = (0., 0., 1., 0., 0., 0., 0.)
+
+    def unwrap(self, t: int) -> int:
+        """Unwrap a board timestamp to the one nearest to the latest sync.
+
+        Parameters
+        ----------
+        t: int
+            Board time (us) read from `micros()`.
+
+        Returns
+        -------
+        t: int
+            Board time (us) which does not wrap around.
+        """
+        t = t % WRAP
+        if self.__last is None:
+            return t
+        base = self.__last - self.__last % WRAP
+        candidates = (base - WRAP + t, base + t, base + WRAP + t)
+        return min(candidates, key=lambda c: abs(c - self.__last))
+
+    def sync(self) -> None:
+        """Run a burst of pings and update the fit."""
+        best: Optional[Tuple[int, float, float]] = None
+        for _ in range(self.__burst):
+            sent = self.__clock()
+            try:
+                raw = self.__ino.board_micros()
+            except TimeoutError:
+                # a lost reply is not a sample
+                continue
+            received = self.__clock()
+            rtt = received - sent
+            if best is None or rtt < best[2]:
+                best = (raw, (sent + received) / 2, rtt)
+        self.__last_sync = self.__clock()
+        self.__wall_offset = self.__wall() - self.__clock()
+        if best is None:
+            return None
+        board = self.unwrap(best[0])
+        self.__last = board
+        self.__samples.append((board, best[1], best[2]))
+        self.__update_fit()
+
+    def poll(self) -> bool:
+        """Synchronize if `interval` has elapsed since the last one.
+
+        Returns
+        -------
+        synced: bool
+            True if synchronization is run.
+        """
+        if self.__clock() - self.__last_sync < self.__interval:
+            return False
+        self.sync()
+        return True
+
+    def __update_fit(self) -> None:
+        n = len(self.__samples)
+        x0, y0, _ = self.__samples[0]
+        xs = [(b - x0) * 1e-6 for b, _, _ in self.__samples]
+        ys = [h - y0 for _, h, _ in self.__samples]
+        xm = sum(xs) / n
+        ym = sum(ys) / n
+        sxx = sum((x - xm)**2 for x in xs)
+        if n < 2 or sxx == 0.:
+            slope = 1.
+        else:
+            slope = sum((x - xm) * (y - ym) for x, y in zip(xs, ys)) / sxx
+        intercept = ym - slope * xm
+        if n > 2:
+            s2 = sum((y - intercept - slope * x)**2
+                     for x, y in zip(xs, ys)) / (n - 2)
+        else:
+            s2 = 0.
+        self.__fit = (x0, y0 + intercept, slope, xm, sxx, s2,
+                      min(r for _, _, r in self.__samples) / 2)
+
+    @property
+    def synced(self) -> bool:
+        return len(self.__samples) > 0
+
+    @property
+    def drift(self) -> float:
+        """Rate of the host clock relative to the board clock, minus 1"""
+        return self.__fit[2] - 1.
+
+    def board_to_host(self, t: int) -> Tuple[float, float]:
+        """Convert a board timestamp into host time.
+
+        Parameters
+        ----------
+        t: int
+            Board time (us) read from `micros()`.
+
+        Returns
+        -------
+        time: float
+            Host time (sec) by the wall clock.
+        uncertainty: float
+            Estimated error (sec) of `time`.
+        """
+        if not self.synced:
+            raise ValueError("clock is not synchronized yet.")
+        x0, y0, slope, xm, sxx, s2, half_rtt = self.__fit
+        x = (self.unwrap(t) - x0) * 1e-6
+        err = half_rtt + sqrt(s2)
+        if sxx > 0.:
+            err += sqrt(s2 / sxx) * abs(x - xm)
+        return y0 + slope * x + self.__wall_offset, err
+
+    def host_to_board(self, t: float) -> int:
+        """Convert host time into board time.
+
+        Parameters
+        ----------
+        t: float
+            Host time (sec) by the wall clock.
+
+        Returns
+        -------
+        time: int
+            Board time (us) as `micros()` reads it.
+        """
+        if not self.synced:
+            raise ValueError("clock is not synchronized yet.")
+        x0, y0, slope, _, _, _, _ = self.__fit
+        t -= self.__wall_offset
+        return int(round(x0 + (t - y0) / slope * 1e6)) % WRAP
@@ -1,7 +1,6 @@
+import os
 from typing import Any, Dict, List, Optional, Tuple
 
-import yaml
-
 Setting = Dict[str, Any]
 # Alias for settings
 ExperimentalSetting = Setting
@@ -11,8 +10,10 @@ MetadataSetting = Setting
 class ComportSetting(Dict[str, Any]):
     """Interface to configure `Comport` by yaml file"""
     available_attr = [
-        "arduino", "port", "baudrate", "timeout", "sketch", "warmup"
+        "arduino", "port", "baudrate", "timeout", "sketch", "warmup",
+        "transport"
     ]
+    available_transports = ["serial", "tcp", "loopback"]
 
     def __init__(self, setting: Optional[List[Tuple[str, Any]]] = None):
         """Instantiate ComportSetting
@@ -53,14 +54,23 @@ class ComportSetting(Dict[str, Any]):
         elif key == "warmup":
             if not isinstance(value, float):
                 raise ValueError("`warmup` must be float")
+        elif key == "transport":
+            if value not in self.available_transports:
+                raise ValueError(f"{value} is not allowed as transport.")
         super().__setitem__(key, value)
 
+    def copy(self) -> 'ComportSetting':
+        """Return a copy without validating the settings again"""
+        setting = ComportSetting.__new__(ComportSetting)
+        dict.update(setting, self)
+        return setting
+
 
 class PinModeSetting(Dict[int, str]):
     """Interface to configure pin mode by yaml file"""
     available_modes = [
         "INPUT", "INPUT_PULLUP", "OUTPUT", "SERVO", "SSINPUT",
-        "SSINPUT_PULLUP", "PULSE"
+        "SSINPUT_PULLUP", "PULSE", "COUNTER", "COUNTER_PULLUP"
     ]
 
     def __init__(self, setting: Optional[List[Tuple[int, str]]] = None):
@@ -84,22 +94,128 @@ class PinModeSetting(Dict[int, str]):
             raise ValueError(f"{value} is not allowed as pin mode.")
         super().__setitem__(key, value)
 
+    def copy(self) -> 'PinModeSetting':
+        """Return a copy without validating the settings again"""
+        setting = PinModeSetting.__new__(PinModeSetting)
+        dict.update(setting, self)
+        return setting
+
+
+def cache_dir() -> str:
+    """Return the directory where parsed yaml files are cached"""
+    d = os.environ.get("PINO_CACHE_DIR")
+    if d is not None:
+        return d
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "pino")
+
+
+def parse_yaml(text: bytes) -> dict:
+    """Parse yaml with the libyaml loader if available"""
+    import yaml
+    try:
+        loader = yaml.CSafeLoader
+    except AttributeError:
+        loader = yaml.SafeLoader  # type: ignore
+    return yaml.load(text, Loader=loader)
+
+
+def _own_file(path: str) -> bool:
+    # a cache file written by another user may be planted
+    if not hasattr(os, "getuid"):
+        return True
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and st.st_mode & 0o022 == 0
+
+
+def load_yaml(path: str, cache: bool = True) -> dict:
+    """Load a yaml file through the on-disk cache of parsed files.
+
+    A cached result is used while the modification time and the size of
+    the file are unchanged, or while its content hash is unchanged.
+    Results are cached by `marshal`, which can not run code on loading,
+    and only cache files owned by the current user are read. Documents
+    which `marshal` can not store (e.g. dates) are parsed every time.
+
+    Parameters
+    ----------
+    path: str
+        Path to a yaml file.
+    cache: bool = True
+        Use the cache.
+
+    Returns
+    -------
+    d: dict
+        Parsed yaml.
+    """
+    if not cache:
+        with open(path, "rb") as f:
+            return parse_yaml(f.read())
+    import marshal
+    from hashlib import sha1
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = sha1(path.encode()).hexdigest()
+    cached = os.path.join(cache_dir(), key + ".marshal")
+    digest = None
+    d: Any = None
+    try:
+        if _own_file(cached):
+            with open(cached, "rb") as f:
+                mtime, size, digest, d = marshal.load(f)
+            if (mtime, size) == (st.st_mtime_ns, st.st_size) \
+                    and isinstance(d, dict):
+                return d
+    except (OSError, EOFError, ValueError, TypeError):
+        digest = None
+    with open(path, "rb") as f:
+        text = f.read()
+    h = sha1(text).hexdigest()
+    if h != digest or not isinstance(d, dict):
+        d = parse_yaml(text)
+    try:
+        data = marshal.dumps((st.st_mtime_ns, st.st_size, h, d))
+    except ValueError:
+        # not a plain document
+        return d
+    try:
+        os.makedirs(cache_dir(), mode=0o700, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cached)
+    except OSError:
+        pass
+    return d
+
 
 class Config(dict):
     """Read the yaml file and generate `ComportSetting` and `PinModeSetting`"""
-    def __init__(self, path: str) -> None:
+    def __init__(self, path: str, cache: bool = True) -> None:
         """Instantiate Config
 
         Parameters
         ----------
         path: str
             Path to a yaml file.
+        cache: bool = True
+            Use the on-disk cache of parsed yaml files.
         """
-        f = open(path, "r")
         self.__path = path
-        d: dict = yaml.safe_load(f)
+        # validated settings and the sections they were generated from
+        self.__comport: Optional[Tuple[dict, ComportSetting]] = None
+        self.__pinmode: Optional[Tuple[dict, PinModeSetting]] = None
+        d: dict = load_yaml(path, cache)
         [self.__setitem__(item[0], item[1]) for item in d.items()]
-        f.close()
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        # settings generated from the old value are stale
+        self.__comport = None
+        self.__pinmode = None
+        super().__setitem__(key, value)
 
     def __missing__(self) -> Setting:
         return dict()
@@ -108,15 +224,21 @@ class Config(dict):
     def comport(self) -> ComportSetting:
         """Return `ComportSetting` generated based on the yaml file
 
+        The setting is validated once while the section is unchanged, and
+        each access returns a copy which the caller may modify.
+
         Returns
         -------
         comport: ComportSetting
             Instance of `ComportSetting` generated based on the yaml file
         """
-        cms = ComportSetting()
-        for k, v in self["Comport"].items():
-            cms[k] = v
-        return cms
+        section = self["Comport"]
+        if self.__comport is None or self.__comport[0] != section:
+            cms = ComportSetting()
+            for k, v in section.items():
+                cms[k] = v
+            self.__comport = (dict(section), cms)
+        return self.__comport[1].copy()
 
     @property
     def experimental(self) -> ExperimentalSetting:
@@ -133,12 +255,18 @@ class Config(dict):
     def pinmode(self) -> PinModeSetting:
         """Return `PinModeSetting` generated based on the yaml file
 
+        The setting is validated once while the section is unchanged, and
+        each access returns a copy which the caller may modify.
+
         Returns
         -------
         pinmode: PinModeSetting
             Instance of `PinModeSetting` generated based on the yaml file
         """
-        pms = PinModeSetting()
-        for k, v in self["PinMode"].items():
-            pms[k] = v
-        return pms
+        section = self["PinMode"]
+        if self.__pinmode is None or self.__pinmode[0] != section:
+            pms = PinModeSetting()
+            for k, v in section.items():
+                pms[k] = v
+            self.__pinmode = (dict(section), pms)
+        return self.__pinmode[1].copy()
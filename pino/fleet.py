@@ -0,0 +1,337 @@
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from time import sleep, time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from pino.config import ComportSetting, Config, PinModeSetting
+from pino.ino import Arduino, Comport
+from pino.measurement import EdgeCount, parse_measurement
+
+# status of boards
+STARTING = 0
+RUNNING = 1
+FAILED = 2
+STOPPED = 3
+
+NUM_PINS = 20
+MAX_LINE = 256
+ERROR_SIZE = 128
+
+# `seq` is odd while a worker is updating the row
+STATE_DTYPE = np.dtype([("seq", "<u4"), ("status", "u1"),
+                        ("heartbeat", "<f8"), ("last_event", "<f8"),
+                        ("state", "i1", (NUM_PINS, )),
+                        ("events", "<u4", (NUM_PINS, )),
+                        ("error", f"S{ERROR_SIZE}")],
+                       align=True)
+
+
+class BoardSpec(NamedTuple):
+    """Settings to connect to a board in a fleet"""
+    comport: ComportSetting
+    pinmode: Optional[PinModeSetting] = None
+
+    @staticmethod
+    def from_config(config: Config) -> 'BoardSpec':
+        pinmode = config.pinmode if "PinMode" in config else None
+        return BoardSpec(config.comport, pinmode)
+
+
+class _Row(object):
+    """Writer of a row of the state table"""
+    def __init__(self, table: np.ndarray, idx: int):
+        self.__row = table[idx:idx + 1]
+
+    def __enter__(self) -> np.ndarray:
+        self.__row["seq"] += 1
+        return self.__row
+
+    def __exit__(self, *args) -> None:
+        self.__row["seq"] += 1
+
+
+def _record_line(row: np.ndarray, line: bytes) -> None:
+    m = parse_measurement(line)
+    if isinstance(m, EdgeCount):
+        if not 0 <= m.pin < NUM_PINS:
+            return None
+        row["events"][0, m.pin] += m.count
+    elif m is None:
+        try:
+            pin = int(line)
+        except ValueError:
+            return None
+        if abs(pin) >= NUM_PINS:
+            return None
+        # the board sends `pin` when falling and `-pin` when rising
+        row["state"][0, abs(pin)] = int(pin < 0)
+        row["events"][0, abs(pin)] += 1
+    row["last_event"] = time()
+
+
+def _split_lines(buf: bytearray) -> List[bytes]:
+    # take complete lines and leave a partial line in `buf`
+    end = buf.rfind(b"\n")
+    if end < 0:
+        if len(buf) > MAX_LINE:
+            # not a line from the firmware
+            buf.clear()
+        return []
+    lines = bytes(buf[:end]).split(b"\n")
+    del buf[:end + 1]
+    return lines
+
+
+def _work(first: int, specs: List[BoardSpec], shm_name: str, n: int,
+          commands: Any, interval: float, timeout: float) -> None:
+    shm = SharedMemory(name=shm_name)
+    table = np.ndarray((n, ), dtype=STATE_DTYPE, buffer=shm.buf)
+    # the comport is kept with its board, since the port is closed
+    # when the comport is collected
+    boards: Dict[int, Tuple[Comport, Arduino]] = {}
+    # bytes received after the last complete line of each board
+    partial: Dict[int, bytearray] = {}
+
+    def fail(idx: int, e: Exception) -> None:
+        board = boards.pop(idx, None)
+        if board is not None:
+            try:
+                board[0].disconnect()
+            except Exception:
+                pass
+        with _Row(table, idx) as row:
+            row["status"] = FAILED
+            row["error"] = f"{type(e).__name__}: {e}".encode(
+                "utf-8", "replace")[:ERROR_SIZE]
+
+    for i, spec in enumerate(specs):
+        idx = first + i
+        try:
+            if spec.comport.get("timeout") is None:
+                spec.comport["timeout"] = timeout
+            com = Comport.derive(spec.comport).connect()
+            ino = Arduino(com)
+            boards[idx] = (com, ino)
+            partial[idx] = bytearray()
+            if spec.pinmode is not None:
+                ino.apply_pinmode_settings(spec.pinmode)
+            with _Row(table, idx) as row:
+                row["status"] = RUNNING
+        except Exception as e:
+            fail(idx, e)
+
+    running = True
+    while running:
+        busy = False
+        while True:
+            try:
+                cmd = commands.get_nowait()
+            except Empty:
+                break
+            if cmd is None:
+                running = False
+                break
+            idx, method, args = cmd
+            if idx not in boards:
+                continue
+            try:
+                getattr(boards[idx][1], method)(*args)
+            except Exception as e:
+                fail(idx, e)
+            busy = True
+        for idx, (_, ino) in list(boards.items()):
+            try:
+                # read only bytes already received, so that a line is
+                # never cut by the read timeout
+                waiting = ino.connection.in_waiting
+                if waiting == 0:
+                    continue
+                partial[idx] += ino.connection.read(waiting)
+            except Exception as e:
+                fail(idx, e)
+                continue
+            busy = True
+            lines = _split_lines(partial[idx])
+            if len(lines) == 0:
+                continue
+            with _Row(table, idx) as row:
+                for line in lines:
+                    try:
+                        _record_line(row, line)
+                    except (ValueError, OverflowError):
+                        # skip a garbled line
+                        continue
+        now = time()
+        for idx in boards:
+            with _Row(table, idx) as row:
+                row["heartbeat"] = now
+        if not busy:
+            sleep(interval)
+
+    for idx, (com, _) in boards.items():
+        try:
+            com.disconnect()
+        except Exception:
+            pass
+        with _Row(table, idx) as row:
+            row["status"] = STOPPED
+    del table
+    shm.close()
+
+
+class Fleet(object):
+    """Run boards in worker processes and share their states
+
+    Each worker process runs `boards_per_worker` boards, so that decoding
+    is spread over cores and a failure of a board does not stop the
+    others. Workers publish the latest pin states and event counters of
+    each board into a table in shared memory, which is read without
+    round trips to the workers. Commands are sent through a queue for
+    each worker.
+    """
+    def __init__(self,
+                 specs: List[BoardSpec],
+                 boards_per_worker: int = 1,
+                 interval: float = 0.001,
+                 timeout: float = 1.):
+        """Instantiate Fleet
+
+        Parameters
+        ----------
+        specs: List[BoardSpec]
+            Settings of each board.
+        boards_per_worker: int = 1
+            Number of boards run by a worker process.
+        interval: float = 0.001
+            Waiting time (sec) of workers when boards are idle.
+        timeout: float = 1.
+            Read timeout (sec) of boards whose setting has no timeout.
+        """
+        self.__specs = specs
+        self.__per_worker = boards_per_worker
+        self.__interval = interval
+        self.__timeout = timeout
+        self.__shm: Optional[SharedMemory] = None
+        self.__workers: List[Any] = []
+        self.__queues: List[Any] = []
+
+    def __enter__(self) -> 'Fleet':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def __len__(self) -> int:
+        return len(self.__specs)
+
+    def start(self) -> 'Fleet':
+        """Start worker processes and connect to the boards."""
+        n = len(self.__specs)
+        self.__shm = SharedMemory(create=True,
+                                  size=max(STATE_DTYPE.itemsize * n, 1))
+        self.__table = np.ndarray((n, ),
+                                  dtype=STATE_DTYPE,
+                                  buffer=self.__shm.buf)
+        self.__table[:] = np.zeros(n, dtype=STATE_DTYPE)
+        for first in range(0, n, self.__per_worker):
+            specs = self.__specs[first:first + self.__per_worker]
+            queue: Any = mp.Queue()
+            worker = mp.Process(target=_work,
+                                args=(first, specs, self.__shm.name, n,
+                                      queue, self.__interval,
+                                      self.__timeout),
+                                daemon=True)
+            worker.start()
+            self.__queues.append(queue)
+            self.__workers.append(worker)
+        return self
+
+    def stop(self, timeout: float = 5.) -> None:
+        """Stop worker processes and release the shared memory."""
+        for queue in self.__queues:
+            queue.put(None)
+        for worker in self.__workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self.__queues = []
+        self.__workers = []
+        if self.__shm is not None:
+            del self.__table
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+    def send(self, board: int, method: str, *args: Any) -> None:
+        """Call a method of `Arduino` on a board in its worker.
+
+        Parameters
+        ----------
+        board: int
+            Index of the board.
+        method: str
+            Name of the method (e.g. "digital_write").
+        args: Any
+            Arguments of the method.
+        """
+        self.__queues[board // self.__per_worker].put((board, method, args))
+
+    def snapshot(self, board: Optional[int] = None) -> np.ndarray:
+        """Copy rows of the state table consistently.
+
+        Parameters
+        ----------
+        board: Optional[int] = None
+            Index of the board. All boards if None.
+
+        Returns
+        -------
+        rows: np.ndarray
+            Structured array of `STATE_DTYPE`.
+        """
+        if board is None:
+            return np.concatenate(
+                [self.snapshot(i) for i in range(len(self.__specs))])
+        row = self.__table[board:board + 1]
+        worker = self.__workers[board // self.__per_worker]
+        while True:
+            seq = int(row["seq"][0])
+            if seq % 2 == 0:
+                copied = row.copy()
+                if int(row["seq"][0]) == seq:
+                    return copied
+            elif not worker.is_alive():
+                # the writer died while updating the row
+                return row.copy()
+            # let the writer finish
+            sleep(0)
+
+    def states(self, board: int) -> np.ndarray:
+        """Latest state (1: HIGH / 0: LOW) of each pin of a board"""
+        return self.snapshot(board)["state"][0]
+
+    def events(self, board: int) -> np.ndarray:
+        """Number of edges seen on each pin of a board"""
+        return self.snapshot(board)["events"][0]
+
+    def status(self, board: int) -> int:
+        """STARTING, RUNNING, FAILED or STOPPED"""
+        status = int(self.__table["status"][board])
+        worker = self.__workers[board // self.__per_worker]
+        if status != STOPPED and not worker.is_alive():
+            return FAILED
+        return status
+
+    def error(self, board: int) -> Optional[str]:
+        """Error which made a board FAILED, or None"""
+        error = bytes(self.snapshot(board)["error"][0])
+        if len(error) == 0:
+            return None
+        return error.decode("utf-8", "replace")
+
+    def alive(self) -> List[bool]:
+        """Whether each board is running"""
+        return [self.status(i) == RUNNING for i in range(len(self.__specs))]
@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Callable, List, NamedTuple, Optional, Sequence, TypeVar, \
+    Union
+
+from pino.ino import HIGH, INPUT, LOW, OUTPUT, Arduino, PinState
+from pino.measurement import ActionFired, parse_measurement
+
+T = TypeVar("T")
+Pins = Union[int, Sequence[int]]
+
+
+class GroupReport(NamedTuple):
+    """Host times when the armed writes were executed on each board"""
+    fired: List[Optional[float]]
+    uncertainty: float
+
+    @property
+    def skew(self) -> Optional[float]:
+        """Difference (sec) between the earliest and the latest write"""
+        fired = [t for t in self.fired if t is not None]
+        if len(fired) < 2:
+            return None
+        return max(fired) - min(fired)
+
+
+class BoardGroup(object):
+    """Write to several boards at once
+
+    Writes are armed on each board ahead of time and fired either at a
+    scheduled board time, after aligning clocks by `sync_clocks`, or on a
+    rising edge of a trigger pin driven by one of the boards.
+    """
+    def __init__(self, boards: List[Arduino]):
+        """Instantiate BoardGroup
+
+        Parameters
+        ----------
+        boards: List[Arduino]
+            Boards in the group.
+        """
+        self.__boards = boards
+        self.__pool = ThreadPoolExecutor(max_workers=len(boards))
+        self.__trigger: Optional[Sequence[int]] = None
+        self.__leader = 0
+
+    def __len__(self) -> int:
+        return len(self.__boards)
+
+    def __map(self, f: Callable[..., T], *args: Sequence) -> List[T]:
+        # write to all ports in parallel
+        return list(self.__pool.map(f, self.__boards, *args))
+
+    def __pins(self, pins: Pins) -> Sequence[int]:
+        if isinstance(pins, int):
+            return [pins] * len(self.__boards)
+        if len(pins) != len(self.__boards):
+            raise ValueError("number of pins must match number of boards.")
+        return pins
+
+    def sync_clocks(self) -> None:
+        """Synchronize the clock of each board with the host clock."""
+        self.__map(lambda ino: ino.clock.sync())
+
+    def write_at(self,
+                 pins: Pins,
+                 state: PinState,
+                 lead: float = 0.05) -> float:
+        """Arm a write on each board at the same host time.
+
+        Parameters
+        ----------
+        pins: Pins
+            Pin number, or a pin number for each board.
+        state: PinState
+            HIGH or LOW.
+        lead: float = 0.05
+            Time (sec) from now to the write. It must be longer than the
+            time to send the commands.
+
+        Returns
+        -------
+        t: float
+            Host time (sec) the writes are scheduled at.
+        """
+        if not all(ino.clock.synced for ino in self.__boards):
+            self.sync_clocks()
+        t = time() + lead
+
+        def arm(ino: Arduino, pin: int) -> None:
+            ino.arm_at(pin, state, ino.clock.host_to_board(t))
+
+        self.__map(arm, self.__pins(pins))
+        return t
+
+    def write_on_trigger(self, pins: Pins, state: PinState, leader: int,
+                         trigger: Pins) -> None:
+        """Arm a write on each board and fire it by a trigger pin.
+
+        The leader drives its trigger pin HIGH and the others watch their
+        trigger pin wired to it. The trigger is raised only after every
+        board has acknowledged arming, so no board misses the edge.
+
+        Parameters
+        ----------
+        pins: Pins
+            Pin number, or a pin number for each board.
+        state: PinState
+            HIGH or LOW.
+        leader: int
+            Index of the board driving the trigger.
+        trigger: Pins
+            Trigger pin number, or a trigger pin number for each board.
+        """
+        triggers = self.__pins(trigger)
+        lead = self.__boards[leader]
+        lead.set_pinmode(triggers[leader], OUTPUT)
+        lead.digital_write(triggers[leader], LOW)
+
+        def arm(ino: Arduino, pin: int, trig: int) -> None:
+            if ino is not lead:
+                ino.set_pinmode(trig, INPUT)
+            # the leader watches its own output.
+            # returns after the board acknowledges arming
+            ino.arm_on_trigger(pin, state, trig)
+
+        try:
+            self.__map(arm, self.__pins(pins), triggers)
+        except TimeoutError:
+            # do not fire on only some of the boards
+            self.disarm()
+            raise
+        self.__trigger = triggers
+        lead.digital_write(triggers[leader], HIGH)
+        self.__leader = leader
+
+    def collect(self) -> GroupReport:
+        """Wait until every board reports its write.
+
+        Lines other than the report read in the meantime are discarded.
+        Boards whose report is not read before timeout are None.
+
+        Returns
+        -------
+        report: GroupReport
+            Host time of each write converted by the clock of each board.
+            Times are None if clocks are not synchronized.
+        """
+        def wait(ino: Arduino) -> Optional[ActionFired]:
+            while True:
+                line = ino.read_until_eol()
+                if line is None:
+                    return None
+                m = parse_measurement(line)
+                if isinstance(m, ActionFired):
+                    return m
+
+        reports = self.__map(wait)
+        if self.__trigger is not None:
+            lead = self.__boards[self.__leader]
+            lead.digital_write(self.__trigger[self.__leader], LOW)
+            self.__trigger = None
+        fired: List[Optional[float]] = []
+        uncertainty = 0.
+        for ino, m in zip(self.__boards, reports):
+            if m is None or not ino.clock.synced:
+                fired.append(None)
+                continue
+            t, err = ino.clock.board_to_host(m.board_us)
+            fired.append(t)
+            uncertainty = max(uncertainty, err)
+        return GroupReport(fired, 2 * uncertainty)
+
+    def disarm(self) -> None:
+        """Cancel armed writes on every board."""
+        self.__map(lambda ino: ino.disarm())
+
+    def close(self) -> None:
+        self.__pool.shutdown()
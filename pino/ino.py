@@ -1,13 +1,20 @@
 import os
 import sys
 from enum import Enum
-from subprocess import check_output
 from time import sleep
-from typing import Any, Iterable, List, Optional
-
-from serial import Serial, SerialException  # type: ignore
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Tuple
 
 from pino.config import ComportSetting, PinModeSetting
+from pino.measurement import STATS_SIZE, FirmwareStats, Measurement, \
+    parse_measurement
+from pino.metrics import InstrumentedConnection, Metrics
+from pino.trace import CapturedConnection, TraceWriter
+
+# pyserial, subprocess and transports (socket, select and threading) are
+# imported when they are used first to keep `import pino.ino` fast.
+if TYPE_CHECKING:
+    from pino.clock import ClockSync
+    from pino.transport import Transport
 
 
 class Comport(object):
@@ -24,7 +31,9 @@ class Comport(object):
         self.__baudrate = 115200
         self.__sketch = join(dirname(abspath(__file__)), "proto")
         self.__warmup: Optional[float] = None
-        self.__conn = None
+        self.__transport = "serial"
+        self.__conn: Optional['Transport'] = None
+        self.__metrics: Optional[Metrics] = None
 
     def __del__(self):
         if self.__conn is None:
@@ -101,7 +110,8 @@ class Comport(object):
         Parameters
         ----------
         port: str
-            Serial port (e.g. "/dev/ttyACM0").
+            Serial port (e.g. "/dev/ttyACM0"), or "host:port" of a serial
+            bridge when the transport is "tcp".
 
         Returns
         -------
@@ -124,6 +134,7 @@ class Comport(object):
         self: Comport
             Comport that is applied a given setting.
         """
+        from serial import Serial, SerialException  # type: ignore
         if baudrate not in Serial.BAUDRATES:
             raise SerialException("Given baudrate cannot be used")
         self.__baudrate = baudrate
@@ -177,6 +188,41 @@ class Comport(object):
         self.__warmup = duration
         return self
 
+    def set_transport(self, transport: str) -> 'Comport':
+        """specify how to connect to the board.
+
+        Parameters
+        ----------
+        transport: str
+            "serial" (default), "tcp" for a serial bridge on "host:port"
+            given by `set_port`, or "loopback" for an in-memory stream.
+
+        Returns
+        -------
+        self: Comport
+            Comport that is applied a given setting.
+        """
+        if transport not in ComportSetting.available_transports:
+            raise ValueError(f"{transport} is not available as transport.")
+        self.__transport = transport
+        return self
+
+    def set_metrics(self, metrics: Optional[Metrics]) -> 'Comport':
+        """collect metrics of the communication with the board.
+
+        Parameters
+        ----------
+        metrics: Optional[Metrics]
+            Metrics to record into. None disables metrics.
+
+        Returns
+        -------
+        self: Comport
+            Comport that is applied a given setting.
+        """
+        self.__metrics = metrics
+        return self
+
     def __set_param(self, k: str, v: Any) -> 'Comport':
         if k == "arduino":
             self.set_arduino(v)
@@ -190,6 +236,8 @@ class Comport(object):
             self.set_sketch(v)
         elif k == "warmup":
             self.set_warmup(v)
+        elif k == "transport":
+            self.set_transport(v)
         return self
 
     @staticmethod
@@ -213,13 +261,27 @@ class Comport(object):
 
     def connect(self) -> 'Comport':
         """connect to the serial port"""
-        self.__conn = Serial(self.__port,
-                             self.__baudrate,
-                             timeout=self.__timeout)
+        if self.__metrics is not None:
+            with self.__metrics.time("connect"):
+                self.__open()
+        else:
+            self.__open()
+        self.__wait_warmup()
+        return self
+
+    def __open(self) -> None:
+        from pino.transport import open_transport
+        self.__conn = open_transport(self.__transport, self.__port,
+                                     self.__baudrate, self.__timeout)
+
+    def __wait_warmup(self) -> None:
         if self.__warmup is not None:
             t: float = self.__warmup
-            sleep(t)
-        return self
+            if self.__metrics is not None:
+                with self.__metrics.time("warmup"):
+                    sleep(t)
+            else:
+                sleep(t)
 
     def disconnect(self):
         """disconnect serial port"""
@@ -227,7 +289,8 @@ class Comport(object):
             if self.__conn is None:
                 return None
             self.__conn.close()
-        except SerialException:
+        except OSError:
+            # including `SerialException`
             pass
         return None
 
@@ -239,15 +302,28 @@ class Comport(object):
         """Write the arduino sketch to connected board"""
         if self.__port is None:
             raise ValueError("Port is not specified.")
-        check_output(self.__as_command(self.__arduino, self.__sketch,
-                                       self.__port),
-                     shell=True)
+        from subprocess import check_output
+        command = self.__as_command(self.__arduino, self.__sketch,
+                                    self.__port)
+        if self.__metrics is not None:
+            with self.__metrics.time("deploy"):
+                check_output(command, shell=True)
+        else:
+            check_output(command, shell=True)
         return self
 
     @property
-    def connection(self) -> Optional[Serial]:
+    def connection(self) -> Optional['Transport']:
         return self.__conn
 
+    @property
+    def transport(self) -> str:
+        return self.__transport
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        return self.__metrics
+
     @property
     def port(self) -> Optional[str]:
         return self.__port
@@ -308,6 +384,8 @@ class PinMode(Enum):
     SSINPUT = b'\x04'
     SSINPUT_PULLUP = b'\x05'
     PULSE = b'\x06'
+    COUNTER = b'\x07'
+    COUNTER_PULLUP = b'\x08'
 
 
 INPUT = PinMode.INPUT
@@ -316,6 +394,8 @@ OUTPUT = PinMode.OUTPUT
 SSINPUT = PinMode.SSINPUT
 SSINPUT_PULLUP = PinMode.SSINPUT_PULLUP
 SERVO = PinMode.SERVO
+COUNTER = PinMode.COUNTER
+COUNTER_PULLUP = PinMode.COUNTER_PULLUP
 
 
 class PinState(Enum):
@@ -330,19 +410,145 @@ LOW = PinState.LOW
 HIGH = PinState.HIGH
 
 
+def as_pinmode(mode_str: str) -> PinMode:
+    """Convert a pin mode in `PinModeSetting` into `PinMode`
+
+    Parameters
+    ----------
+    mode_str: str
+        Name of the pin mode (e.g. "OUTPUT").
+
+    Returns
+    -------
+    mode: PinMode
+    """
+    if mode_str == "INPUT":
+        mode = INPUT
+    elif mode_str == "INPUT_PULLUP":
+        mode = INPUT_PULLUP
+    elif mode_str == "SSINPUT":
+        mode = SSINPUT
+    elif mode_str == "SSINPUT_PULLUP":
+        mode = SSINPUT_PULLUP
+    elif mode_str == "OUTPUT":
+        mode = OUTPUT
+    elif mode_str == "SERVO":
+        mode = SERVO
+    elif mode_str == "COUNTER":
+        mode = COUNTER
+    elif mode_str == "COUNTER_PULLUP":
+        mode = COUNTER_PULLUP
+    else:
+        raise NotImplementedError(f"{mode_str} cannot be used as pin mode.")
+    return mode
+
+
+PulseTable = List[Tuple[int, int]]
+
+
+def encode_profile(settings: PinModeSetting,
+                   pulses: Optional[PulseTable] = None,
+                   persist: bool = False) -> bytes:
+    """Encode pin modes and pulse settings into a profile
+
+    Parameters
+    ----------
+    settings: PinModeSetting
+        A dict describing pin mode settings.
+    pulses: Optional[PulseTable] = None
+        Pairs of frequency and duration of pulses, indexed by position.
+    persist: bool = False
+        Store the profile into EEPROM of the board.
+
+    Returns
+    -------
+    profile: bytes
+    """
+    if pulses is None:
+        pulses = []
+    payload = as_bytes(int(persist)) + as_bytes(len(settings))
+    for pin in settings:
+        payload += as_bytes(pin) + as_pinmode(settings[pin]).value
+    payload += as_bytes(len(pulses))
+    for idx, (freq, duration) in enumerate(pulses):
+        payload += as_bytes(idx) + as_bytes(freq) + as_bytes(duration)
+    if len(payload) > 255:
+        raise ValueError("profile is too large.")
+    return payload
+
+
+def profile_crc(profile: bytes) -> int:
+    """CRC-CCITT of a profile, same as `_crc_ccitt_update` of avr-libc
+
+    Parameters
+    ----------
+    profile: bytes
+        Profile encoded by `encode_profile`.
+
+    Returns
+    -------
+    crc: int
+    """
+    crc = 0xFFFF
+    for b in profile:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc
+
+
 class Arduino(object):
     """Interface for operating arduino board"""
-    def __init__(self, comport: Comport):
+    def __init__(self,
+                 comport: Comport,
+                 capture: Optional[TraceWriter] = None):
         """Instantiate Arduino class.
 
         Parameters
         ----------
         comport: Comport
             Comport used for communicating with arduino board.
+        capture: Optional[TraceWriter] = None
+            If given, frames written to and read from the board are
+            recorded into the trace.
         """
         if comport.connection is None:
             raise ValueError("comport does not connected to serial port.")
-        self.__conn = comport.connection
+        self.__conn: Any = comport.connection
+        if comport.metrics is not None:
+            self.__conn = InstrumentedConnection(self.__conn, comport.metrics)
+        if capture is not None:
+            self.__conn = CapturedConnection(self.__conn, capture)
+        self.__clock: Optional['ClockSync'] = None
+        # replies are read into this buffer to avoid allocations
+        self.__reply = bytearray(16)
+        self.__view = memoryview(self.__reply)
+
+    @property
+    def connection(self) -> Any:
+        """Connection used for communicating with arduino board"""
+        return self.__conn
+
+    def __read_reply(self, size: int) -> memoryview:
+        if size > len(self.__reply):
+            return memoryview(self.__conn.read(size))
+        n = self.__conn.readinto(self.__view[:size])
+        return self.__view[:n]
+
+    def readinto(self, buf: Any) -> int:
+        """Read bytes sent from the board into a buffer.
+
+        Parameters
+        ----------
+        buf: Any
+            Writable bytes-like object (e.g. bytearray) owned by the caller.
+
+        Returns
+        -------
+        n: int
+            Number of bytes read. Less than `len(buf)` on timeout.
+        """
+        return self.__conn.readinto(buf)
 
     def set_pinmode(self, pin: int, mode: PinMode) -> None:
         """Set the mode of a pin.
@@ -367,25 +573,76 @@ class Arduino(object):
             A dict describing pin mode settings.
         """
         for pin in settings:
-            mode_str = settings[pin]
-            if mode_str == "INPUT":
-                mode = INPUT
-            elif mode_str == "INPUT_PULLUP":
-                mode = INPUT_PULLUP
-            if mode_str == "SSINPUT":
-                mode = SSINPUT
-            elif mode_str == "SSINPUT_PULLUP":
-                mode = SSINPUT_PULLUP
-            elif mode_str == "OUTPUT":
-                mode = OUTPUT
-            elif mode_str == "SERVO":
-                mode = SERVO
-            else:
-                raise NotImplementedError(
-                    f"{mode_str} cannot be used as pin mode.")
-
+            mode = as_pinmode(settings[pin])
             self.set_pinmode(pin, mode)
 
+    def upload_profile(self,
+                       settings: PinModeSetting,
+                       pulses: Optional[PulseTable] = None,
+                       persist: bool = False) -> int:
+        """Apply pin modes and pulse settings in one transfer.
+
+        Parameters
+        ----------
+        settings: PinModeSetting
+            A dict describing pin mode settings.
+        pulses: Optional[PulseTable] = None
+            Pairs of frequency and duration of pulses, indexed by position.
+        persist: bool = False
+            Store the profile into EEPROM so that the board applies it
+            when it starts, before accepting commands.
+
+        Returns
+        -------
+        crc: int
+            Checksum of the profile.
+        """
+        profile = encode_profile(settings, pulses, persist)
+        crc = profile_crc(profile)
+        proto = b'\x09' + as_bytes(len(profile)) + profile \
+            + crc.to_bytes(2, "little")
+        self.__conn.write(proto)
+        return crc
+
+    def stored_profile_crc(self) -> int:
+        """Read the checksum of the profile stored in EEPROM.
+
+        Returns
+        -------
+        crc: int
+            Checksum of the stored profile, or 0 if there is none.
+            TimeoutError is raised if the board does not reply.
+        """
+        proto = b'\x24' + as_bytes(0)
+        self.__conn.write(proto)
+        data = self.__read_reply(2)
+        if len(data) < 2:
+            raise TimeoutError("firmware did not reply profile checksum.")
+        return int.from_bytes(data, "little")
+
+    def apply_profile(self,
+                      settings: PinModeSetting,
+                      pulses: Optional[PulseTable] = None) -> bool:
+        """Persist a profile unless the board has already stored it.
+
+        Parameters
+        ----------
+        settings: PinModeSetting
+            A dict describing pin mode settings.
+        pulses: Optional[PulseTable] = None
+            Pairs of frequency and duration of pulses, indexed by position.
+
+        Returns
+        -------
+        uploaded: bool
+            False if the stored profile matches and nothing is sent.
+        """
+        crc = profile_crc(encode_profile(settings, pulses, True))
+        if self.stored_profile_crc() == crc:
+            return False
+        self.upload_profile(settings, pulses, True)
+        return True
+
     def digital_write(self, pin: int, state: PinState) -> None:
         """Set HIGH or LOW to the specified pin.
 
@@ -410,7 +667,9 @@ class Arduino(object):
         states: Iterable[PinState]
             List of HIGH or LOW.
         """
-        [self.digital_write(pin, state) for pin, state in zip(pins, states)]
+        self.__conn.writev([
+            state.value + as_bytes(pin) for pin, state in zip(pins, states)
+        ])
 
     def digital_read(self,
                      pin: int,
@@ -434,7 +693,7 @@ class Arduino(object):
         """
         proto = b'\x20' + as_bytes(pin)
         self.__conn.write(proto)
-        if self.__conn.read(size) == b'\x00':
+        if self.__read_reply(size) == b'\x00':
             return LOW
         return HIGH
 
@@ -462,7 +721,9 @@ class Arduino(object):
         vs: int
             List of output voltage. `v` must be in bound from 0 - 255.
         """
-        [self.analog_write(pin, v) for pin, v in zip(pins, vs)]
+        self.__conn.writev([
+            b'\x12' + as_bytes(pin) + as_bytes(v) for pin, v in zip(pins, vs)
+        ])
 
     def analog_read(self,
                     pin: int,
@@ -488,6 +749,97 @@ class Arduino(object):
         self.__conn.write(proto)
         return self.__conn.read(size)
 
+    def arm_at(self, pin: int, state: PinState, t: int) -> None:
+        """Set HIGH or LOW to the pin when the board clock reaches `t`.
+
+        Parameters
+        ----------
+        pin: int
+            Pin number.
+        state: PinState
+            HIGH or LOW.
+        t: int
+            Board time (us) as `micros()` reads it.
+        """
+        proto = b'\x16' + as_bytes(pin) + as_bytes(int(state == HIGH)) \
+            + (t % (1 << 32)).to_bytes(4, "little")
+        self.__conn.write(proto)
+
+    def arm_on_trigger(self, pin: int, state: PinState, trigger: int) -> None:
+        """Set HIGH or LOW to the pin on a rising edge of the trigger pin.
+
+        The board acknowledges the command, so the write is armed when
+        this method returns.
+
+        Parameters
+        ----------
+        pin: int
+            Pin number.
+        state: PinState
+            HIGH or LOW.
+        trigger: int
+            Pin number watched for a rising edge.
+        """
+        proto = b'\x17' + as_bytes(pin) + as_bytes(int(state == HIGH)) \
+            + as_bytes(trigger)
+        self.__conn.write(proto)
+        if len(self.__read_reply(1)) < 1:
+            raise TimeoutError("firmware did not acknowledge arming.")
+
+    def disarm(self) -> None:
+        """Cancel a write armed by `arm_at` or `arm_on_trigger`."""
+        proto = b'\x18' + as_bytes(0)
+        self.__conn.write(proto)
+
+    def board_micros(self) -> int:
+        """Read the board clock (`micros()`).
+
+        Returns
+        -------
+        t: int
+            Time (us) since the board started. It wraps around every 2^32 us.
+        """
+        proto = b'\x22' + as_bytes(0)
+        self.__conn.write(proto)
+        data = self.__read_reply(4)
+        if len(data) < 4:
+            raise TimeoutError("firmware did not reply board time.")
+        return int.from_bytes(data, "little")
+
+    def firmware_stats(self, reset: bool = False) -> FirmwareStats:
+        """Read statistics of the main loop of the firmware.
+
+        Parameters
+        ----------
+        reset: bool = False
+            Reset the statistics after reading.
+
+        Returns
+        -------
+        stats: FirmwareStats
+            Scan rate, longest scan gap, rx buffer usage and number of
+            unknown commands.
+        """
+        proto = b'\x23' + as_bytes(int(reset))
+        self.__conn.write(proto)
+        data = self.__read_reply(STATS_SIZE)
+        if len(data) < STATS_SIZE:
+            raise TimeoutError("firmware did not reply statistics.")
+        return FirmwareStats.decode(data)
+
+    @property
+    def clock(self) -> 'ClockSync':
+        """Synchronization between the board clock and the host clock
+
+        It is not updated in the background, since pings share the port
+        with other commands. Call `clock.poll()` periodically (e.g. in the
+        loop reading the board) to keep it synchronized.
+        """
+        if self.__clock is None:
+            from pino.clock import ClockSync
+            self.__clock = ClockSync(self)
+        return self.__clock
+
     def read_until_eol(self) -> Optional[bytes]:
         """Read until end of line from serial port.
 
@@ -508,6 +860,56 @@ class Arduino(object):
             return None
         return line
 
+    def set_count_window(self, window: int) -> None:
+        """Set the window over which edges on COUNTER pins are counted.
+
+        The board reports the number of rising edges of each COUNTER pin
+        once per window instead of sending every edge.
+
+        Parameters
+        ----------
+        window: int
+            Counting window (ms). `window` must be in bound from 0 - 65535.
+            0 stops reporting.
+        """
+        proto = b'\x30' + window.to_bytes(2, "little")
+        self.__conn.write(proto)
+
+    def start_capture(self, n: int = 0) -> None:
+        """Start measuring period and pulse width on pin 8 (ICP1).
+
+        Timer1 is used for the measurement, so servos and PWM output on
+        pin 9 and 10 do not work while capturing. Their settings are
+        restored when the capture stops.
+
+        Parameters
+        ----------
+        n: int = 0
+            Number of periods to measure. 0 measures until `stop_capture`
+            is called. `n` must be in bound from 0 - 255.
+        """
+        proto = b'\x31' + as_bytes(n)
+        self.__conn.write(proto)
+
+    def stop_capture(self) -> None:
+        """Stop measuring period and pulse width on pin 8."""
+        proto = b'\x32' + as_bytes(0)
+        self.__conn.write(proto)
+
+    def read_measurement(self) -> Optional[Measurement]:
+        """Read a line and decode it as a measurement.
+
+        Returns
+        -------
+        measurement: Optional[Measurement]
+            `EdgeCount` or `PulseCapture`. None if reading is cancelled or
+            the line is not a measurement.
+        """
+        line = self.read_until_eol()
+        if line is None:
+            return None
+        return parse_measurement(line)
+
     def cancel_read(self) -> None:
         """Cancel reading."""
         self.__conn.cancel_read()
@@ -543,18 +945,21 @@ class Arduino(object):
         angle: Iterable[int]
             Angles to rotate.
         """
-        [self.servo_rotate(pin, angle) for pin, angle in zip(pins, angles)]
+        self.__conn.writev([
+            b'\x13' + as_bytes(pin) + as_bytes(angle)
+            for pin, angle in zip(pins, angles)
+        ])
 
 
 # TODO: Interfaces needs to be revised.
 class Optuino(Arduino):
     maxidx = 50
 
-    def __init__(self, comport: Comport):
-        super().__init__(comport)
-        if comport.connection is None:
-            raise ValueError("comport does not connected to serial port.")
-        self.__conn = comport.connection
+    def __init__(self,
+                 comport: Comport,
+                 capture: Optional[TraceWriter] = None):
+        super().__init__(comport, capture)
+        self.__conn = self.connection
         self.__frequency: List[int] = []
         self.__duration: List[int] = []
         self.__pulsing = False
@@ -0,0 +1,103 @@
+import struct
+from typing import NamedTuple, Optional, Union
+
+# Clock frequency of arduino uno, which drives Timer1 without prescaling
+CLOCK_HZ = 16000000
+
+
+class EdgeCount(NamedTuple):
+    """Number of rising edges counted on a pin during a counting window"""
+    pin: int
+    count: int
+    elapsed_us: int
+
+    @property
+    def frequency(self) -> float:
+        """Edge rate (Hz) during the window"""
+        if self.elapsed_us == 0:
+            return 0.
+        return self.count * 1e6 / self.elapsed_us
+
+
+class PulseCapture(NamedTuple):
+    """Period and pulse width measured by Timer1 input capture (pin 8)"""
+    period_ticks: int
+    high_ticks: int
+
+    @property
+    def period(self) -> float:
+        """Period (sec)"""
+        return self.period_ticks / CLOCK_HZ
+
+    @property
+    def width(self) -> float:
+        """Pulse width, time spent at HIGH (sec)"""
+        return self.high_ticks / CLOCK_HZ
+
+    @property
+    def frequency(self) -> float:
+        """Frequency (Hz)"""
+        if self.period_ticks == 0:
+            return 0.
+        return CLOCK_HZ / self.period_ticks
+
+    @property
+    def duty(self) -> float:
+        """Ratio of pulse width to period"""
+        if self.period_ticks == 0:
+            return 0.
+        return self.high_ticks / self.period_ticks
+
+
+class ActionFired(NamedTuple):
+    """Board time when an armed write was executed"""
+    pin: int
+    board_us: int
+
+
+_stats = struct.Struct("<IIHHH")
+STATS_SIZE = _stats.size
+
+
+class FirmwareStats(NamedTuple):
+    """Statistics of the main loop of the firmware"""
+    loop_rate: int  # input scans per second
+    max_gap_us: int  # longest time between input scans
+    rx_high_water: int  # largest number of bytes waiting in the rx buffer
+    rx_saturated: int  # times the rx buffer became full
+    unknown_opcodes: int  # commands the firmware did not recognize
+
+    @staticmethod
+    def decode(data: bytes) -> 'FirmwareStats':
+        """Decode the reply to the statistics query"""
+        return FirmwareStats(*_stats.unpack(data))
+
+
+Measurement = Union[EdgeCount, PulseCapture, ActionFired]
+
+
+def parse_measurement(line: bytes) -> Optional[Measurement]:
+    """Parse a line sent from the board into a measurement.
+
+    Parameters
+    ----------
+    line: bytes
+        A line read by `Arduino.read_until_eol`.
+
+    Returns
+    -------
+    measurement: Optional[Measurement]
+        `EdgeCount`, `PulseCapture` or `ActionFired`, or None if the line
+        is not a measurement (e.g. state transition of SSINPUT pins).
+    """
+    fields = line.strip().split(b",")
+    try:
+        if fields[0] == b"c" and len(fields) == 4:
+            return EdgeCount(int(fields[1]), int(fields[2]), int(fields[3]))
+        if fields[0] == b"p" and len(fields) == 3:
+            return PulseCapture(int(fields[1]), int(fields[2]))
+        if fields[0] == b"f" and len(fields) == 3:
+            return ActionFired(int(fields[1]), int(fields[2]))
+    except ValueError:
+        return None
+    return None
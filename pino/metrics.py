@@ -0,0 +1,235 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter, perf_counter_ns
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# upper bounds (sec) of histogram buckets
+LATENCY_BUCKETS = (5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2,
+                   2.5e-2, 5e-2, 1e-1, 2.5e-1, 5e-1, 1.)
+DURATION_BUCKETS = (1e-2, 5e-2, 1e-1, 5e-1, 1., 2., 5., 10., 30., 60.)
+
+
+class Histogram(object):
+    """Histogram with fixed buckets"""
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.__bounds = tuple(bounds)
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__sum = 0.
+        self.__count = 0
+
+    def observe(self, v: float) -> None:
+        self.__counts[bisect_left(self.__bounds, v)] += 1
+        self.__sum += v
+        self.__count += 1
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Cumulative counts for each upper bound (the last is +Inf)"""
+        cumulative: List[Tuple[float, int]] = []
+        n = 0
+        for bound, count in zip(self.__bounds + (float("inf"), ),
+                                self.__counts):
+            n += count
+            cumulative.append((bound, n))
+        return cumulative
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.__count,
+            "sum": self.__sum,
+            "buckets": self.buckets()
+        }
+
+
+def _opcode(op: int) -> str:
+    return f"0x{op:02x}"
+
+
+def _bound(b: float) -> str:
+    return "+Inf" if b == float("inf") else repr(b)
+
+
+class Metrics(object):
+    """Counters and latency histograms of the communication with a board
+
+    Enable it by `Comport.set_metrics` before connecting. Connections of
+    comports without metrics are not wrapped, so nothing is measured and
+    nothing is paid when metrics are disabled.
+    """
+    def __init__(self):
+        self.__commands: Dict[int, int] = {}
+        self.__bytes_out = 0
+        self.__bytes_in = 0
+        self.__lines = 0
+        self.__timeouts: Dict[int, int] = {}
+        self.__latency: Dict[int, Histogram] = {}
+        self.__durations: Dict[str, Histogram] = {}
+
+    def count_write(self, data: bytes) -> None:
+        """Count a frame written to the board."""
+        self.__bytes_out += len(data)
+        if len(data) > 0:
+            op = data[0]
+            self.__commands[op] = self.__commands.get(op, 0) + 1
+
+    def observe_read(self,
+                     opcode: Optional[int],
+                     size: int,
+                     latency: float,
+                     requested: Optional[int] = None) -> None:
+        """Record a reply read after writing a command.
+
+        A reply shorter than `requested` bytes is counted as a timeout
+        and its latency is not recorded.
+        """
+        self.__bytes_in += size
+        if opcode is None:
+            return None
+        if size == 0 or (requested is not None and size < requested):
+            self.__timeouts[opcode] = self.__timeouts.get(opcode, 0) + 1
+            return None
+        hist = self.__latency.get(opcode)
+        if hist is None:
+            hist = self.__latency[opcode] = Histogram(LATENCY_BUCKETS)
+        hist.observe(latency)
+
+    def count_line(self, size: int) -> None:
+        """Count a line sent from the board."""
+        self.__bytes_in += size
+        self.__lines += 1
+
+    def observe_duration(self, name: str, duration: float) -> None:
+        """Record the duration of an operation (e.g. connect)."""
+        hist = self.__durations.get(name)
+        if hist is None:
+            hist = self.__durations[name] = Histogram(DURATION_BUCKETS)
+        hist.observe(duration)
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Measure the duration of the block as operation `name`."""
+        start = perf_counter()
+        try:
+            yield None
+        finally:
+            self.observe_duration(name, perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current values of all metrics."""
+        return {
+            "commands": {_opcode(k): v
+                         for k, v in self.__commands.items()},
+            "bytes_out": self.__bytes_out,
+            "bytes_in": self.__bytes_in,
+            "lines": self.__lines,
+            "timeouts": {_opcode(k): v
+                         for k, v in self.__timeouts.items()},
+            "read_latency": {
+                _opcode(k): h.snapshot()
+                for k, h in self.__latency.items()
+            },
+            "durations":
+            {k: h.snapshot()
+             for k, h in self.__durations.items()},
+        }
+
+    def to_prometheus(self, prefix: str = "pino") -> str:
+        """Return metrics in Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def header(name: str, kind: str, doc: str) -> None:
+            lines.append(f"# HELP {prefix}_{name} {doc}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def histogram(name: str, label: str, value: str,
+                      hist: Histogram) -> None:
+            for bound, count in hist.buckets():
+                lines.append(f'{prefix}_{name}_bucket{{{label}="{value}",'
+                             f'le="{_bound(bound)}"}} {count}')
+            lines.append(f'{prefix}_{name}_sum{{{label}="{value}"}} '
+                         f'{hist.sum!r}')
+            lines.append(f'{prefix}_{name}_count{{{label}="{value}"}} '
+                         f'{hist.count}')
+
+        header("commands_total", "counter", "Commands written to the board.")
+        for op, n in sorted(self.__commands.items()):
+            lines.append(f'{prefix}_commands_total{{opcode="{_opcode(op)}"}}'
+                         f' {n}')
+        header("written_bytes_total", "counter", "Bytes written.")
+        lines.append(f"{prefix}_written_bytes_total {self.__bytes_out}")
+        header("read_bytes_total", "counter", "Bytes read.")
+        lines.append(f"{prefix}_read_bytes_total {self.__bytes_in}")
+        header("lines_total", "counter", "Lines sent from the board.")
+        lines.append(f"{prefix}_lines_total {self.__lines}")
+        header("read_timeouts_total", "counter",
+               "Replies which were not read before timeout.")
+        for op, n in sorted(self.__timeouts.items()):
+            lines.append(f'{prefix}_read_timeouts_total'
+                         f'{{opcode="{_opcode(op)}"}} {n}')
+        header("read_latency_seconds", "histogram",
+               "Time from writing a command to reading its reply.")
+        for op, hist in sorted(self.__latency.items()):
+            histogram("read_latency_seconds", "opcode", _opcode(op), hist)
+        header("operation_duration_seconds", "histogram",
+               "Duration of connect, warmup and deploy.")
+        for name, hist in sorted(self.__durations.items()):
+            histogram("operation_duration_seconds", "operation", name, hist)
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedConnection(object):
+    """Serial connection which counts traffic into `Metrics`"""
+    def __init__(self, conn: Any, metrics: Metrics):
+        self.__conn = conn
+        self.__metrics = metrics
+        self.__opcode: Optional[int] = None
+        self.__written = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__conn, name)
+
+    def write(self, data: bytes) -> Optional[int]:
+        self.__metrics.count_write(data)
+        if len(data) > 0:
+            self.__opcode = data[0]
+        self.__written = perf_counter_ns()
+        return self.__conn.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self.__conn.read(size)
+        latency = (perf_counter_ns() - self.__written) / 1e9
+        self.__metrics.observe_read(self.__opcode, len(data), latency,
+                                    size)
+        # a reply is paired with only one command
+        self.__opcode = None
+        return data
+
+    def writev(self, bufs: Sequence[bytes]) -> int:
+        for b in bufs:
+            self.__metrics.count_write(b)
+        if len(bufs) > 0 and len(bufs[-1]) > 0:
+            self.__opcode = bufs[-1][0]
+        self.__written = perf_counter_ns()
+        return self.__conn.writev(bufs)
+
+    def readinto(self, buf: Any) -> int:
+        n = self.__conn.readinto(buf)
+        latency = (perf_counter_ns() - self.__written) / 1e9
+        self.__metrics.observe_read(self.__opcode, n, latency,
+                                    memoryview(buf).nbytes)
+        self.__opcode = None
+        return n
+
+    def readline(self) -> bytes:
+        line = self.__conn.readline()
+        # an empty line is a timeout, not traffic
+        if len(line) > 0:
+            self.__metrics.count_line(len(line))
+        return line
@@ -1,4 +1,6 @@
+#include <EEPROM.h>
 #include <Servo.h>
+#include <util/crc16.h>
 
 
 struct StateTransitionPin {
@@ -88,24 +90,30 @@ StateTransitionPin initSSPin() {
 
 void setPinModeSS(StateTransitionPin *sspin, int pin, int mode) {
   pinMode(pin, mode);
-  sspin->pins[sspin->pinNum] = pin;
+  if (sspin->pinNum >= 13) {
+    return;
+  }
+  int i = sspin->pinNum;
+  sspin->pins[i] = pin;
+  sspin->currState[i] = 0;
+  sspin->prevState[i] = 0;
   sspin->pinNum++;
 }
 
 void resetPinModeSS(StateTransitionPin *sspin, int pin) {
-  if (sspin->pinNum > 0) {
-    for (int i=0; i<sspin->pinNum; i++) {
-      if (sspin->pins[i] == pin) {
-        sspin->pinNum--;
-        for (int j=i; j<13; j++) {
-          if (j < 13) {
-            sspin->pins[j] = sspin->pins[j+1];
-          } else {
-            sspin->pins[j] = 0;
-          }
-        }
-      }
+  int i = 0;
+  while (i < sspin->pinNum) {
+    if (sspin->pins[i] != pin) {
+      i++;
+      continue;
     }
+    sspin->pinNum--;
+    for (int j=i; j<sspin->pinNum; j++) {
+      sspin->pins[j] = sspin->pins[j+1];
+      sspin->currState[j] = sspin->currState[j+1];
+      sspin->prevState[j] = sspin->prevState[j+1];
+    }
+    sspin->pins[sspin->pinNum] = 0;
   }
 }
 
@@ -123,6 +131,326 @@ void checkPinState(StateTransitionPin *sspin) {
   }
 }
 
+// Edge counters: rising edges on counter pins are counted by pin change
+// interrupts and only the totals are reported once per counting window.
+volatile unsigned long edgeCounts[14];
+volatile uint8_t counterMaskB = 0;
+volatile uint8_t counterMaskD = 0;
+volatile uint8_t lastPortB = 0;
+volatile uint8_t lastPortD = 0;
+unsigned int countWindow = 1000;  // ms
+unsigned long windowStart = 0;
+
+ISR(PCINT0_vect) {
+  uint8_t curr = PINB;
+  uint8_t rising = (curr & ~lastPortB) & counterMaskB;
+  lastPortB = curr;
+  for (uint8_t i=0; rising; i++, rising >>= 1) {
+    if (rising & 1) {
+      edgeCounts[8 + i]++;
+    }
+  }
+}
+
+ISR(PCINT2_vect) {
+  uint8_t curr = PIND;
+  uint8_t rising = (curr & ~lastPortD) & counterMaskD;
+  lastPortD = curr;
+  for (uint8_t i=0; rising; i++, rising >>= 1) {
+    if (rising & 1) {
+      edgeCounts[i]++;
+    }
+  }
+}
+
+void setPinModeCounter(int pin, int mode) {
+  // pin 0 and 1 are used by the serial port
+  if (pin < 2 || pin > 13) {
+    return;
+  }
+  pinMode(pin, mode);
+  noInterrupts();
+  edgeCounts[pin] = 0;
+  if (pin < 8) {
+    lastPortD = PIND;
+    counterMaskD |= _BV(pin);
+    PCMSK2 |= _BV(pin);
+    PCICR |= _BV(PCIE2);
+  } else {
+    lastPortB = PINB;
+    counterMaskB |= _BV(pin - 8);
+    PCMSK0 |= _BV(pin - 8);
+    PCICR |= _BV(PCIE0);
+  }
+  interrupts();
+}
+
+void resetPinModeCounter(int pin) {
+  if (pin < 2 || pin > 13) {
+    return;
+  }
+  noInterrupts();
+  if (pin < 8) {
+    counterMaskD &= ~_BV(pin);
+    PCMSK2 &= ~_BV(pin);
+  } else {
+    counterMaskB &= ~_BV(pin - 8);
+    PCMSK0 &= ~_BV(pin - 8);
+  }
+  interrupts();
+}
+
+void reportCounters() {
+  if (countWindow == 0 || (counterMaskB | counterMaskD) == 0) {
+    return;
+  }
+  unsigned long now = micros();
+  unsigned long elapsed = now - windowStart;
+  if (elapsed < (unsigned long)countWindow * 1000UL) {
+    return;
+  }
+  windowStart = now;
+  for (int pin=2; pin<14; pin++) {
+    bool counted = pin < 8 ? (counterMaskD & _BV(pin)) : (counterMaskB & _BV(pin - 8));
+    if (!counted) {
+      continue;
+    }
+    noInterrupts();
+    unsigned long count = edgeCounts[pin];
+    edgeCounts[pin] = 0;
+    interrupts();
+    // c,<pin>,<count>,<elapsed (us)>
+    Serial.print("c,");
+    Serial.print(pin);
+    Serial.print(',');
+    Serial.print(count);
+    Serial.print(',');
+    Serial.println(elapsed);
+  }
+}
+
+// Input capture: Timer1 timestamps edges on ICP1 (pin 8) at F_CPU, giving
+// 62.5 ns resolution on an UNO. Timer1 is shared with `Servo` and with
+// `analogWrite` on pin 9 and 10, so they cannot be used during capture.
+volatile unsigned int captureOverflows = 0;
+volatile unsigned long lastRise = 0;
+volatile unsigned long lastFall = 0;
+volatile unsigned long capturedPeriod = 0;
+volatile unsigned long capturedHigh = 0;
+volatile uint8_t captureState = 0;
+volatile uint8_t captureReady = 0;
+volatile uint8_t captureRemaining = 0;
+volatile bool capturing = false;
+
+// Timer1 settings of `Servo` or `analogWrite`, restored after capture
+uint8_t savedTCCR1A = 0;
+uint8_t savedTCCR1B = 0;
+uint8_t savedTIMSK1 = 0;
+
+// must be called with interrupts disabled
+void restoreTimer1() {
+  if (!capturing) {
+    return;
+  }
+  TIMSK1 = savedTIMSK1;
+  TCCR1A = savedTCCR1A;
+  TCCR1B = savedTCCR1B;
+  capturing = false;
+}
+
+void stopCapture() {
+  noInterrupts();
+  restoreTimer1();
+  interrupts();
+}
+
+void startCapture(int n) {
+  pinMode(8, INPUT);
+  resetPinModeCounter(8);
+  noInterrupts();
+  if (!capturing) {
+    savedTCCR1A = TCCR1A;
+    savedTCCR1B = TCCR1B;
+    savedTIMSK1 = TIMSK1;
+  }
+  TIMSK1 = 0;
+  TCCR1A = 0;
+  TCCR1B = 0;
+  TCNT1 = 0;
+  captureOverflows = 0;
+  captureState = 0;
+  captureReady = 0;
+  captureRemaining = n;
+  capturing = true;
+  TIFR1 = _BV(ICF1) | _BV(TOV1);
+  // noise canceler, rising edge first, no prescaling
+  TCCR1B = _BV(ICNC1) | _BV(ICES1) | _BV(CS10);
+  TIMSK1 = _BV(ICIE1) | _BV(TOIE1);
+  interrupts();
+}
+
+ISR(TIMER1_OVF_vect) {
+  captureOverflows++;
+}
+
+ISR(TIMER1_CAPT_vect) {
+  unsigned int icr = ICR1;
+  unsigned int ovf = captureOverflows;
+  // an overflow pending while capturing belongs to this capture only
+  // if the captured value is from after the overflow
+  if ((TIFR1 & _BV(TOV1)) && icr < 0x8000) {
+    ovf++;
+  }
+  unsigned long t = ((unsigned long)ovf << 16) | icr;
+  if (TCCR1B & _BV(ICES1)) {
+    if (captureState == 2) {
+      capturedPeriod = t - lastRise;
+      capturedHigh = lastFall - lastRise;
+      captureReady = 1;
+      if (captureRemaining > 0 && --captureRemaining == 0) {
+        // interrupts are disabled in ISR
+        restoreTimer1();
+        return;
+      }
+    }
+    lastRise = t;
+    captureState = 1;
+    TCCR1B &= ~_BV(ICES1);
+  } else {
+    lastFall = t;
+    if (captureState == 1) {
+      captureState = 2;
+    }
+    TCCR1B |= _BV(ICES1);
+  }
+  // changing the edge may set the capture flag
+  TIFR1 = _BV(ICF1);
+}
+
+void reportCapture() {
+  if (!captureReady) {
+    return;
+  }
+  noInterrupts();
+  unsigned long period = capturedPeriod;
+  unsigned long high = capturedHigh;
+  captureReady = 0;
+  interrupts();
+  // p,<period (tick)>,<high (tick)>
+  Serial.print("p,");
+  Serial.print(period);
+  Serial.print(',');
+  Serial.println(high);
+}
+
+// Armed write: fired at a scheduled board time or on a rising edge of a
+// trigger pin, so that writes on several boards happen together.
+struct ArmedAction {
+  bool armed;
+  bool onTrigger;
+  bool prevTrigger;
+  int pin;
+  int state;
+  int trigger;
+  unsigned long target;
+};
+
+ArmedAction armedAction = { false, false, false, 0, 0, 0, 0 };
+
+void fireArmed() {
+  if (armedAction.state) {
+    digiHIGH[armedAction.pin]();
+  } else {
+    digiLOW[armedAction.pin]();
+  }
+  unsigned long now = micros();
+  armedAction.armed = false;
+  // f,<pin>,<board time (us)>
+  Serial.print("f,");
+  Serial.print(armedAction.pin);
+  Serial.print(',');
+  Serial.println(now);
+}
+
+void checkArmed() {
+  if (!armedAction.armed) {
+    return;
+  }
+  if (armedAction.onTrigger) {
+    bool level = digiRead[armedAction.trigger]() != 0;
+    if (level && !armedAction.prevTrigger) {
+      fireArmed();
+    }
+    armedAction.prevTrigger = level;
+  } else if ((long)(micros() - armedAction.target) >= 0) {
+    fireArmed();
+  }
+}
+
+// Loop telemetry: scan rate, the longest time between input scans and
+// usage of the receive buffer.
+unsigned long statLoops = 0;
+unsigned long statLoopRate = 0;
+unsigned long statRateStart = 0;
+unsigned long statLastPoll = 0;
+unsigned long statMaxGap = 0;
+unsigned int statRxHigh = 0;
+unsigned int statRxSaturated = 0;
+unsigned int statUnknown = 0;
+bool statRxFull = false;
+
+void trackLoop() {
+  unsigned long now = micros();
+  if (statLastPoll != 0 && now - statLastPoll > statMaxGap) {
+    statMaxGap = now - statLastPoll;
+  }
+  statLastPoll = now;
+  statLoops++;
+  if (now - statRateStart >= 1000000UL) {
+    statLoopRate = statLoops;
+    statLoops = 0;
+    statRateStart = now;
+  }
+  unsigned int available = Serial.available();
+  if (available > statRxHigh) {
+    statRxHigh = available;
+  }
+  // bytes arriving while the buffer is full are dropped
+  bool full = available >= SERIAL_RX_BUFFER_SIZE - 1;
+  if (full && !statRxFull) {
+    statRxSaturated++;
+  }
+  statRxFull = full;
+}
+
+void sendStats(bool reset) {
+  // <loops/sec (4)> <max gap us (4)> <rx high water (2)>
+  // <rx saturated (2)> <unknown opcodes (2)>, little endian
+  uint16_t rxHigh = statRxHigh;
+  uint16_t rxSaturated = statRxSaturated;
+  uint16_t unknown = statUnknown;
+  Serial.write((uint8_t *)&statLoopRate, 4);
+  Serial.write((uint8_t *)&statMaxGap, 4);
+  Serial.write((uint8_t *)&rxHigh, 2);
+  Serial.write((uint8_t *)&rxSaturated, 2);
+  Serial.write((uint8_t *)&unknown, 2);
+  if (reset) {
+    statMaxGap = 0;
+    statRxHigh = 0;
+    statRxSaturated = 0;
+    statUnknown = 0;
+    statLastPoll = 0;
+  }
+}
+
+void pollInputs(StateTransitionPin *sspin) {
+  trackLoop();
+  checkArmed();
+  checkPinState(sspin);
+  reportCounters();
+  reportCapture();
+}
+
 struct PulseSettings {
   int frequency;
   int duration;
@@ -138,7 +466,152 @@ float calculate_pulse_interval(int frequency, int duration) {
 Servo servos[14];
 StateTransitionPin sspin = initSSPin();
 
+void setPulseSettings(int idx, int freq, int duration) {
+  float interval = calculate_pulse_interval(freq, duration);
+  PulseSettings pset = PulseSettings {
+    freq, duration, interval
+  };
+  pulse_settings[idx] = pset;
+}
+
+void applyPinMode(int pin, int mode) {
+  switch (mode) {
+    case '\x00': {
+      pinMode(pin, INPUT);
+      resetPinModeCounter(pin);
+      resetPinModeSS(&sspin, pin);
+      break;
+    }
+
+    case '\x01': {
+      pinMode(pin, INPUT_PULLUP);
+      resetPinModeCounter(pin);
+      resetPinModeSS(&sspin, pin);
+      break;
+    }
+
+    case '\x02': {
+      pinMode(pin, OUTPUT);
+      resetPinModeCounter(pin);
+      resetPinModeSS(&sspin, pin);
+      break;
+    }
+
+    case '\x03': {
+      servos[pin].attach(pin);
+      resetPinModeCounter(pin);
+      resetPinModeSS(&sspin, pin);
+      break;
+    }
+
+    case '\x04': {
+      resetPinModeCounter(pin);
+      // a pin configured again must not be watched twice
+      resetPinModeSS(&sspin, pin);
+      setPinModeSS(&sspin, pin, INPUT);
+      break;
+    }
+
+    case '\x05': {
+      resetPinModeCounter(pin);
+      // a pin configured again must not be watched twice
+      resetPinModeSS(&sspin, pin);
+      setPinModeSS(&sspin, pin, INPUT_PULLUP);
+      break;
+    }
+
+    case '\x07': {
+      resetPinModeSS(&sspin, pin);
+      setPinModeCounter(pin, INPUT);
+      break;
+    }
+
+    case '\x08': {
+      resetPinModeSS(&sspin, pin);
+      setPinModeCounter(pin, INPUT_PULLUP);
+      break;
+    }
+
+    default: {
+      break;
+    }
+  }
+}
+
+// Pin configuration profile:
+//   <flags> <n pins> (<pin> <mode>) * n <n pulses> (<idx> <freq> <duration>) * n
+// flags & 1 persists the profile into EEPROM, which is applied in `setup`.
+// EEPROM layout: <magic> <length> <profile> <crc (2 bytes)>
+const uint8_t PROFILE_MAGIC = 0xA5;
+uint8_t profileBuf[257];
+uint16_t storedCrc = 0;
+
+uint16_t profileCrc(const uint8_t *buf, int length) {
+  uint16_t crc = 0xFFFF;
+  for (int i=0; i<length; i++) {
+    crc = _crc_ccitt_update(crc, buf[i]);
+  }
+  return crc;
+}
+
+bool applyProfile(const uint8_t *buf, int length) {
+  if (length < 3) {
+    return false;
+  }
+  int nPins = buf[1];
+  if (3 + 2 * nPins > length) {
+    return false;
+  }
+  int nPulses = buf[2 + 2 * nPins];
+  if (3 + 2 * nPins + 3 * nPulses != length) {
+    return false;
+  }
+  for (int i=0; i<nPins; i++) {
+    applyPinMode(buf[2 + 2 * i], buf[3 + 2 * i]);
+  }
+  const uint8_t *pulses = buf + 3 + 2 * nPins;
+  for (int i=0; i<nPulses; i++) {
+    if (pulses[3 * i] < 50) {
+      setPulseSettings(pulses[3 * i], pulses[3 * i + 1], pulses[3 * i + 2]);
+    }
+  }
+  return true;
+}
+
+void saveProfile(const uint8_t *buf, int length, uint16_t crc) {
+  if (storedCrc == crc) {
+    return;
+  }
+  EEPROM.update(0, PROFILE_MAGIC);
+  EEPROM.update(1, length);
+  for (int i=0; i<length; i++) {
+    EEPROM.update(2 + i, buf[i]);
+  }
+  EEPROM.update(2 + length, crc & 0xFF);
+  EEPROM.update(3 + length, crc >> 8);
+  storedCrc = crc;
+}
+
+void loadProfile() {
+  if (EEPROM.read(0) != PROFILE_MAGIC) {
+    return;
+  }
+  int length = EEPROM.read(1);
+  for (int i=0; i<length; i++) {
+    profileBuf[i] = EEPROM.read(2 + i);
+  }
+  uint16_t crc = EEPROM.read(2 + length) | (EEPROM.read(3 + length) << 8);
+  if (profileCrc(profileBuf, length) != crc) {
+    return;
+  }
+  if (applyProfile(profileBuf, length)) {
+    storedCrc = crc;
+  }
+}
+
 void setup() {
+  // apply the stored profile before accepting commands
+  loadProfile();
   Serial.begin(115200);
 }
 
@@ -148,46 +621,24 @@ void loop() {
 
   while (1) {
     while ((command = Serial.read()) == -1) {
-      checkPinState(&sspin);
+      pollInputs(&sspin);
     };
 
     while ((pin = Serial.read() ) == -1) {
-      checkPinState(&sspin);
+      pollInputs(&sspin);
     };
 
     switch (command) {
       // pinMode: '\x00' - '\x09'
-      case '\x00': {
-        pinMode(pin, INPUT);
-        resetPinModeSS(&sspin, pin);
-        break;
-      }
-
-      case '\x01': {
-        pinMode(pin, INPUT_PULLUP);
-        resetPinModeSS(&sspin, pin);
-        break;
-      }
-
-      case '\x02': {
-        pinMode(pin, OUTPUT);
-        resetPinModeSS(&sspin, pin);
-        break;
-      }
-
-      case '\x03': {
-        servos[pin].attach(pin);
-        resetPinModeSS(&sspin, pin);
-        break;
-      }
-
-      case '\x04': {
-        setPinModeSS(&sspin, pin, INPUT);
-        break;
-      }
-
-      case '\x05': {
-        setPinModeSS(&sspin, pin, INPUT_PULLUP);
+      case '\x00':
+      case '\x01':
+      case '\x02':
+      case '\x03':
+      case '\x04':
+      case '\x05':
+      case '\x07':
+      case '\x08': {
+        applyPinMode(pin, command);
         break;
       }
 
@@ -195,11 +646,28 @@ void loop() {
         int freq, duration;
         while ((freq = Serial.read()) == -1) {};
         while ((duration = Serial.read()) == -1) {};
-        float interval = calculate_pulse_interval(freq, duration);
-        PulseSettings pset = PulseSettings {
-          freq, duration, interval
-        };
-        pulse_settings[pin] = pset;
+        setPulseSettings(pin, freq, duration);
+        break;
+      }
+
+      case '\x09': {
+        // profile: <length> <payload> <crc (2 bytes)>
+        int length = pin;
+        for (int i=0; i<length + 2; i++) {
+          int b;
+          while ( (b = Serial.read()) == -1) {
+            pollInputs(&sspin);
+          };
+          profileBuf[i] = b;
+        }
+        uint16_t crc = profileBuf[length] | (profileBuf[length + 1] << 8);
+        if (profileCrc(profileBuf, length) != crc) {
+          break;
+        }
+        if (applyProfile(profileBuf, length) && (profileBuf[0] & 1)) {
+          saveProfile(profileBuf, length, crc);
+        }
+        break;
       }
 
       // write: '\x10' - '\x19'
@@ -216,7 +684,7 @@ void loop() {
       case '\x12': {
         int v;
         while ( (v = Serial.read()) == -1) {
-          checkPinState(&sspin);
+          pollInputs(&sspin);
         };
         analogWrite(pin, v);
         break;
@@ -225,7 +693,7 @@ void loop() {
       case '\x13': {
         int angle;
         while ( (angle = Serial.read()) == -1) {
-          checkPinState(&sspin);
+          pollInputs(&sspin);
         };
         servos[pin].write(angle);
         break;
@@ -243,6 +711,45 @@ void loop() {
          break;
       }
 
+      case '\x16': {
+        // arm a write at a board time: <pin> <state> <time (4 bytes)>
+        int state;
+        unsigned long target = 0;
+        while ( (state = Serial.read()) == -1) {
+          pollInputs(&sspin);
+        };
+        for (int i=0; i<4; i++) {
+          int b;
+          while ( (b = Serial.read()) == -1) {
+            pollInputs(&sspin);
+          };
+          target |= (unsigned long)b << (8 * i);
+        }
+        armedAction = { true, false, false, pin, state, 0, target };
+        break;
+      }
+
+      case '\x17': {
+        // arm a write on a trigger: <pin> <state> <trigger pin>
+        int state, trigger;
+        while ( (state = Serial.read()) == -1) {
+          pollInputs(&sspin);
+        };
+        while ( (trigger = Serial.read()) == -1) {
+          pollInputs(&sspin);
+        };
+        bool level = digiRead[trigger]() != 0;
+        armedAction = { true, true, level, pin, state, trigger, 0 };
+        // acknowledge so that the host raises the trigger after arming
+        Serial.write(1);
+        break;
+      }
+
+      case '\x18': {
+        armedAction.armed = false;
+        break;
+      }
+
       // read: '\x20' - '\x29'
       case '\x20': {
         int state = digiRead[pin]();
@@ -256,7 +763,50 @@ void loop() {
         break;
       }
 
+      case '\x22': {
+        // board time for clock synchronization (little endian)
+        unsigned long now = micros();
+        Serial.write((uint8_t *)&now, 4);
+        break;
+      }
+
+      case '\x23': {
+        // `pin` is 1 to reset the statistics after sending
+        sendStats(pin == 1);
+        break;
+      }
+
+      case '\x24': {
+        // crc of the profile stored in EEPROM (0 if none)
+        Serial.write((uint8_t *)&storedCrc, 2);
+        break;
+      }
+
+      // measure: '\x30' - '\x39'
+      case '\x30': {
+        // counting window (ms), `pin` is the lower byte
+        int upper;
+        while ( (upper = Serial.read()) == -1) {
+          pollInputs(&sspin);
+        };
+        countWindow = (unsigned int)pin | ((unsigned int)upper << 8);
+        windowStart = micros();
+        break;
+      }
+
+      case '\x31': {
+        // `pin` is the number of periods to capture (0: until stopped)
+        startCapture(pin);
+        break;
+      }
+
+      case '\x32': {
+        stopCapture();
+        break;
+      }
+
       default: {
+        statUnknown++;
         break;
       }
     }
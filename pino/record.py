@@ -0,0 +1,361 @@
+import os
+import struct
+from time import time
+from typing import List, Optional
+
+import numpy as np
+
+from pino.ino import Arduino
+from pino.measurement import EdgeCount, PulseCapture, parse_measurement
+
+MAGIC = b"PINOLOG\x00"
+VERSION = 1
+
+# kind of records
+EVENT = 0  # state transition of SSINPUT pins, value: 1 (rising) / 0 (falling)
+COUNT = 1  # edge count, value: count / aux: elapsed time (us)
+CAPTURE = 2  # input capture, value: period (tick) / aux: pulse width (tick)
+SAMPLE = 3  # sampled value, value: sampled value
+
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("kind", "u1"), ("pin", "u1"),
+                         ("reserved", "<u2"), ("value", "<i4"),
+                         ("aux", "<i8")])
+INDEX_DTYPE = np.dtype([("time", "<f8"), ("position", "<u8")])
+
+_header = struct.Struct("<8sHHI")
+_record = struct.Struct("<dBBHiq")
+_index = struct.Struct("<dQ")
+
+
+def index_path(path: str) -> str:
+    """Return the path to the sparse time index of a log file"""
+    return path + ".idx"
+
+
+def _read_header(f) -> int:
+    header = f.read(_header.size)
+    if len(header) < _header.size:
+        raise ValueError("log file is truncated.")
+    magic, version, size, stride = _header.unpack(header)
+    if magic != MAGIC or version != VERSION or size != _record.size:
+        raise ValueError("file is not a pino log.")
+    return stride
+
+
+class LogWriter(object):
+    """Append-only writer of fixed-size records
+
+    Records are buffered and written with one `fsync` per batch. Every
+    `index_stride` records, the time and the position of the record are
+    appended to the sparse index (`<path>.idx`).
+    """
+    def __init__(self,
+                 path: str,
+                 flush_records: int = 1024,
+                 flush_interval: float = 1.,
+                 index_stride: int = 4096):
+        """Instantiate LogWriter
+
+        Parameters
+        ----------
+        path: str
+            Path to the log file. An existing log is appended.
+        flush_records: int = 1024
+            Number of records written at once.
+        flush_interval: float = 1.
+            Maximum time (sec) records stay in the buffer.
+        index_stride: int = 4096
+            Number of records between index entries.
+        """
+        self.__flush_records = flush_records
+        self.__flush_interval = flush_interval
+        self.__stride = index_stride
+        self.__n = 0
+        self.__last_time = float("-inf")
+        self.__pending_index: List[bytes] = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                self.__stride = _read_header(f)
+            size = os.path.getsize(path) - _header.size
+            self.__n = size // _record.size
+            # drop a partially written record
+            os.truncate(path, _header.size + self.__n * _record.size)
+            self.__data = open(path, "ab")
+            self.__restore_index(path)
+            self.__last_time = self.__last_record_time(path)
+        else:
+            self.__data = open(path, "wb")
+            self.__data.write(
+                _header.pack(MAGIC, VERSION, _record.size, self.__stride))
+            self.__index = open(index_path(path), "wb")
+        self.__buffer = bytearray()
+        self.__buffered = 0
+        # time when the oldest buffered record was appended
+        self.__oldest = time()
+
+    def __restore_index(self, path: str) -> None:
+        entries = (self.__n + self.__stride - 1) // self.__stride
+        idx = index_path(path)
+        have = os.path.getsize(idx) // _index.size \
+            if os.path.exists(idx) else 0
+        have = min(have, entries)
+        self.__index = open(idx, "ab")
+        self.__index.truncate(have * _index.size)
+        if have == entries:
+            return None
+        # rebuild entries lost before the last fsync
+        with open(path, "rb") as f:
+            for i in range(have, entries):
+                f.seek(_header.size + i * self.__stride * _record.size)
+                t = _record.unpack(f.read(_record.size))[0]
+                self.__index.write(_index.pack(t, i * self.__stride))
+
+    def __last_record_time(self, path: str) -> float:
+        if self.__n == 0:
+            return float("-inf")
+        with open(path, "rb") as f:
+            f.seek(_header.size + (self.__n - 1) * _record.size)
+            return _record.unpack(f.read(_record.size))[0]
+
+    def __enter__(self) -> 'LogWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.__n + self.__buffered
+
+    def append(self,
+               t: float,
+               kind: int,
+               pin: int,
+               value: int,
+               aux: int = 0) -> None:
+        """Append a record.
+
+        Parameters
+        ----------
+        t: float
+            Time (sec) of the record. Times must not decrease; an earlier
+            time than the last record is replaced by the last time.
+        kind: int
+            EVENT, COUNT, CAPTURE or SAMPLE.
+        pin: int
+            Pin number.
+        value: int
+            Value of the record.
+        aux: int = 0
+            Auxiliary value of the record.
+        """
+        if t < self.__last_time:
+            t = self.__last_time
+        self.__last_time = t
+        pos = self.__n + self.__buffered
+        if pos % self.__stride == 0:
+            self.__pending_index.append(_index.pack(t, pos))
+        if self.__buffered == 0:
+            self.__oldest = time()
+        self.__buffer += _record.pack(t, kind, pin, 0, value, aux)
+        self.__buffered += 1
+        if self.__buffered >= self.__flush_records:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self) -> bool:
+        """Flush if records have stayed in the buffer for `flush_interval`.
+
+        Call it periodically while no record is appended so that buffered
+        records are written in bounded time.
+
+        Returns
+        -------
+        flushed: bool
+            True if buffered records were written.
+        """
+        if self.__buffered == 0 \
+                or time() - self.__oldest < self.__flush_interval:
+            return False
+        self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Write buffered records and fsync the log file and its index."""
+        if self.__buffered == 0:
+            return None
+        self.__data.write(self.__buffer)
+        self.__data.flush()
+        os.fsync(self.__data.fileno())
+        self.__n += self.__buffered
+        self.__buffer = bytearray()
+        self.__buffered = 0
+        if len(self.__pending_index) > 0:
+            self.__index.write(b"".join(self.__pending_index))
+            self.__index.flush()
+            os.fsync(self.__index.fileno())
+            self.__pending_index = []
+
+    def close(self) -> None:
+        """Flush and close the log file."""
+        if self.__data.closed:
+            return None
+        self.flush()
+        self.__data.close()
+        self.__index.close()
+
+
+class LogReader(object):
+    """Memory-mapped reader of a log written by `LogWriter`"""
+    def __init__(self, path: str):
+        """Instantiate LogReader
+
+        Parameters
+        ----------
+        path: str
+            Path to the log file.
+        """
+        self.__path = path
+        with open(path, "rb") as f:
+            _read_header(f)
+        self.__records: Optional[np.memmap] = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Map records appended since the file was opened."""
+        n = (os.path.getsize(self.__path) - _header.size) // _record.size
+        if self.__records is not None and len(self.__records) == n:
+            return None
+        if n == 0:
+            self.__records = None
+        else:
+            self.__records = np.memmap(self.__path,
+                                       dtype=RECORD_DTYPE,
+                                       mode="r",
+                                       offset=_header.size,
+                                       shape=(n, ))
+
+    def __len__(self) -> int:
+        if self.__records is None:
+            return 0
+        return len(self.__records)
+
+    @property
+    def records(self) -> np.ndarray:
+        """All records as a memory-mapped structured array"""
+        if self.__records is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return self.__records
+
+    def __index(self) -> np.ndarray:
+        try:
+            return np.fromfile(index_path(self.__path), dtype=INDEX_DTYPE)
+        except FileNotFoundError:
+            return np.empty(0, dtype=INDEX_DTYPE)
+
+    def between(self, start: float, end: float) -> np.ndarray:
+        """Return records whose time is in [start, end).
+
+        Only the pages covering the range are read from the file.
+
+        Parameters
+        ----------
+        start: float
+            Start time (sec).
+        end: float
+            End time (sec).
+
+        Returns
+        -------
+        records: np.ndarray
+            Structured array of `RECORD_DTYPE`.
+        """
+        records = self.records
+        n = len(records)
+        index = self.__index()
+        lo, hi = 0, n
+        if len(index) > 0:
+            first = np.searchsorted(index["time"], start, side="left") - 1
+            last = np.searchsorted(index["time"], end, side="left")
+            lo = int(index["position"][first]) if first >= 0 else 0
+            if last < len(index):
+                hi = int(index["position"][last])
+        region = records[lo:min(hi, n)]
+        times = region["time"]
+        i = np.searchsorted(times, start, side="left")
+        j = np.searchsorted(times, end, side="left")
+        return np.array(region[i:j])
+
+    def close(self) -> None:
+        """Unmap the log file."""
+        self.__records = None
+
+
+class Recorder(object):
+    """Capture events and measurements sent from a board into a log"""
+    def __init__(self, ino: Arduino, writer: LogWriter):
+        """Instantiate Recorder
+
+        Parameters
+        ----------
+        ino: Arduino
+            Board to record. Reading should be done with timeout so that
+            recording can be stopped.
+        writer: LogWriter
+            Log to write records into.
+        """
+        self.__ino = ino
+        self.__writer = writer
+
+    def sample(self, pin: int, value: int) -> None:
+        """Record a value sampled by the host (e.g. `analog_read`)."""
+        self.__writer.append(time(), SAMPLE, pin, value)
+
+    def record_line(self, t: float, line: bytes) -> bool:
+        """Decode a line sent from the board and record it.
+
+        Returns
+        -------
+        recorded: bool
+            False if the line could not be decoded.
+        """
+        m = parse_measurement(line)
+        if isinstance(m, EdgeCount):
+            self.__writer.append(t, COUNT, m.pin, m.count, m.elapsed_us)
+        elif isinstance(m, PulseCapture):
+            self.__writer.append(t, CAPTURE, 8, m.period_ticks, m.high_ticks)
+        else:
+            try:
+                pin = int(line)
+            except ValueError:
+                return False
+            # the board sends `pin` when falling and `-pin` when rising
+            self.__writer.append(t, EVENT, abs(pin), int(pin < 0))
+        return True
+
+    def run(self, duration: Optional[float] = None) -> int:
+        """Record until `duration` elapses or KeyboardInterrupt.
+
+        Parameters
+        ----------
+        duration: Optional[float] = None
+            Recording time (sec). Record until interrupted if None.
+
+        Returns
+        -------
+        n: int
+            Number of records in the log.
+        """
+        start = time()
+        try:
+            while duration is None or time() - start < duration:
+                line = self.__ino.read_until_eol()
+                if line is not None and len(line) > 0:
+                    self.record_line(time(), line)
+                # reading times out on a quiet board
+                self.__writer.maybe_flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.__writer.flush()
+        return len(self.__writer)
@@ -0,0 +1,295 @@
+import struct
+from collections import deque
+from time import perf_counter_ns, sleep, time
+from typing import Any, Deque, Iterator, List, NamedTuple, Optional, \
+    Sequence, Tuple
+
+MAGIC = b"PINOTRC\x00"
+VERSION = 1
+
+# direction of frames
+OUT = 0  # bytes written to the board
+IN = 1  # bytes read by `read`, i.e. replies to a command
+LINE = 2  # lines read by `readline`, i.e. events sent by the board
+
+_header = struct.Struct("<8sHd")
+_frame = struct.Struct("<QBH")
+
+Frame = Tuple[int, int, bytes]
+
+
+class TraceWriter(object):
+    """Write frames exchanged with a board into a compact binary trace
+
+    Each frame is stored as its time (ns, from the start of the trace),
+    direction, length and payload.
+    """
+    def __init__(self, path: str):
+        """Instantiate TraceWriter
+
+        Parameters
+        ----------
+        path: str
+            Path to the trace file.
+        """
+        self.__file = open(path, "wb")
+        self.__file.write(_header.pack(MAGIC, VERSION, time()))
+        self.__start = perf_counter_ns()
+
+    def __enter__(self) -> 'TraceWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def record(self, direction: int, payload: bytes) -> None:
+        """Append a frame stamped with the current time."""
+        t = perf_counter_ns() - self.__start
+        self.__file.write(_frame.pack(t, direction, len(payload)) + payload)
+
+    def close(self) -> None:
+        if self.__file.closed:
+            return None
+        self.__file.close()
+
+
+def read_trace(path: str) -> Tuple[float, List[Frame]]:
+    """Read a trace written by `TraceWriter`.
+
+    Parameters
+    ----------
+    path: str
+        Path to the trace file.
+
+    Returns
+    -------
+    start: float
+        Wall-clock time (sec) when the trace started.
+    frames: List[Frame]
+        List of time (ns), direction and payload.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, start = _header.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("file is not a pino trace.")
+    frames: List[Frame] = []
+    pos = _header.size
+    while pos + _frame.size <= len(data):
+        t, direction, size = _frame.unpack_from(data, pos)
+        pos += _frame.size
+        frames.append((t, direction, data[pos:pos + size]))
+        pos += size
+    return start, frames
+
+
+class CapturedConnection(object):
+    """Serial connection which records traffic into a trace"""
+    def __init__(self, conn: Any, writer: TraceWriter):
+        self.__conn = conn
+        self.__writer = writer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__conn, name)
+
+    def write(self, data: bytes) -> Optional[int]:
+        self.__writer.record(OUT, data)
+        return self.__conn.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self.__conn.read(size)
+        if len(data) > 0:
+            self.__writer.record(IN, data)
+        return data
+
+    def writev(self, bufs: Sequence[bytes]) -> int:
+        for b in bufs:
+            self.__writer.record(OUT, bytes(b))
+        return self.__conn.writev(bufs)
+
+    def readline(self) -> bytes:
+        line = self.__conn.readline()
+        if len(line) > 0:
+            self.__writer.record(LINE, line)
+        return line
+
+    def readinto(self, buf: Any) -> int:
+        n = self.__conn.readinto(buf)
+        if n > 0:
+            self.__writer.record(IN, bytes(memoryview(buf)[:n]))
+        return n
+
+
+class Exchange(NamedTuple):
+    """A command and the reply read for it"""
+    time: int
+    command: bytes
+    reply: bytes
+    latency: Optional[int]
+
+
+def as_exchanges(frames: List[Frame]) -> List[Exchange]:
+    """Pair each written frame with the bytes read before the next write.
+
+    Lines are events sent asynchronously by the board and are not
+    treated as replies.
+    """
+    exchanges: List[Exchange] = []
+    for t, direction, payload in frames:
+        if direction == OUT:
+            exchanges.append(Exchange(t, payload, b"", None))
+        elif direction == IN and len(exchanges) > 0:
+            last = exchanges[-1]
+            latency = t - last.time if last.latency is None else last.latency
+            exchanges[-1] = last._replace(reply=last.reply + payload,
+                                          latency=latency)
+    return exchanges
+
+
+class TraceEndpoint(object):
+    """Fake serial endpoint answering commands with the recorded replies"""
+    def __init__(self, path: str, delay: bool = True):
+        """Instantiate TraceEndpoint
+
+        Parameters
+        ----------
+        path: str
+            Path to the trace file.
+        delay: bool = True
+            Delay replies by the recorded latency.
+        """
+        _, frames = read_trace(path)
+        self.__exchanges = deque(as_exchanges(frames))
+        self.__delay = delay
+        self.__pending: Deque[Tuple[int, bytes]] = deque()
+
+    def write(self, data: bytes) -> int:
+        while len(self.__exchanges) > 0:
+            ex = self.__exchanges.popleft()
+            if ex.command == data:
+                break
+        else:
+            return len(data)
+        if len(ex.reply) > 0:
+            due = perf_counter_ns()
+            if self.__delay and ex.latency is not None:
+                due += ex.latency
+            self.__pending.append((due, ex.reply))
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        if len(self.__pending) == 0:
+            return b""
+        due, reply = self.__pending.popleft()
+        wait = due - perf_counter_ns()
+        if wait > 0:
+            sleep(wait / 1e9)
+        if len(reply) > size:
+            self.__pending.appendleft((due, reply[size:]))
+        return reply[:size]
+
+    def writev(self, bufs: Sequence[bytes]) -> int:
+        return sum(self.write(bytes(b)) for b in bufs)
+
+    def readinto(self, buf: Any) -> int:
+        view = memoryview(buf).cast("B")
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def readline(self) -> bytes:
+        return b""
+
+    def reset_input_buffer(self) -> None:
+        self.__pending.clear()
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    def cancel_read(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayReport(NamedTuple):
+    """Timing achieved by `Replayer.replay`"""
+    frames: int
+    send_lag: List[float]
+    recorded_latency: List[float]
+    achieved_latency: List[float]
+
+    def summary(self) -> dict:
+        """Return mean and maximum of lags and latencies (sec)"""
+        def stat(xs: List[float]) -> Tuple[float, float]:
+            if len(xs) == 0:
+                return (0., 0.)
+            return (sum(xs) / len(xs), max(xs))
+
+        return {
+            "frames": self.frames,
+            "send_lag": stat(self.send_lag),
+            "recorded_latency": stat(self.recorded_latency),
+            "achieved_latency": stat(self.achieved_latency),
+        }
+
+
+class Replayer(object):
+    """Re-issue the commands in a trace with their original timing"""
+    def __init__(self, path: str):
+        """Instantiate Replayer
+
+        Parameters
+        ----------
+        path: str
+            Path to the trace file.
+        """
+        _, frames = read_trace(path)
+        self.__exchanges = as_exchanges(frames)
+
+    def __iter__(self) -> Iterator[Exchange]:
+        return iter(self.__exchanges)
+
+    def replay(self, conn: Any, speed: Optional[float] = 1.) -> ReplayReport:
+        """Write the recorded commands into `conn`.
+
+        Parameters
+        ----------
+        conn: Any
+            Serial connection (e.g. `Comport.connection`) or
+            `TraceEndpoint`.
+        speed: Optional[float] = 1.
+            Time scale of replay. 2. replays twice as fast as recorded.
+            None writes commands as fast as possible.
+
+        Returns
+        -------
+        report: ReplayReport
+            Lag of each write from its schedule and latency of each reply.
+        """
+        send_lag: List[float] = []
+        recorded: List[float] = []
+        achieved: List[float] = []
+        if len(self.__exchanges) == 0:
+            return ReplayReport(0, send_lag, recorded, achieved)
+        origin = self.__exchanges[0].time
+        start = perf_counter_ns()
+        for ex in self.__exchanges:
+            if speed is not None:
+                due = start + int((ex.time - origin) / speed)
+                wait = due - perf_counter_ns()
+                # sleep coarsely, then spin for the last millisecond
+                if wait > 1000000:
+                    sleep((wait - 1000000) / 1e9)
+                while perf_counter_ns() < due:
+                    pass
+                send_lag.append((perf_counter_ns() - due) / 1e9)
+            sent = perf_counter_ns()
+            conn.write(ex.command)
+            if len(ex.reply) > 0 and ex.latency is not None:
+                conn.read(len(ex.reply))
+                achieved.append((perf_counter_ns() - sent) / 1e9)
+                recorded.append(ex.latency / 1e9)
+        return ReplayReport(len(self.__exchanges), send_lag, recorded,
+                            achieved)
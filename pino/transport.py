@@ -0,0 +1,457 @@
+import os
+import select
+import socket
+import threading
+from time import monotonic
+from typing import Any, Optional, Sequence, Tuple
+
+Buffer = Any  # bytes-like object
+
+
+class Transport(object):
+    """Interface of byte streams connected to a board
+
+    `readinto` reads into a buffer owned by the caller and `writev` writes
+    several buffers at once, so that frames are sent and replies are read
+    without allocating new `bytes` for each call.
+    """
+    def readinto(self, buf: Buffer) -> int:
+        """Read up to `len(buf)` bytes into `buf`.
+
+        Returns
+        -------
+        n: int
+            Number of bytes read. Less than `len(buf)` on timeout.
+        """
+        raise NotImplementedError
+
+    def read(self, size: int = 1) -> bytes:
+        buf = bytearray(size)
+        n = self.readinto(buf)
+        return bytes(buf[:n])
+
+    def readline(self) -> bytes:
+        raise NotImplementedError
+
+    def write(self, data: Buffer) -> int:
+        raise NotImplementedError
+
+    def writev(self, bufs: Sequence[Buffer]) -> int:
+        """Write several buffers at once."""
+        return self.write(b"".join(bufs))
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes which can be read without waiting"""
+        raise NotImplementedError
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    def cancel_read(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SerialTransport(Transport):
+    """Transport over a serial port by pyserial"""
+    def __init__(self,
+                 port: Optional[str],
+                 baudrate: int,
+                 timeout: Optional[float],
+                 write_timeout: Optional[float] = None):
+        """Instantiate SerialTransport
+
+        Parameters
+        ----------
+        port: Optional[str]
+            Serial port.
+        baudrate: int
+            Baudrate of the serial port.
+        timeout: Optional[float]
+            Waiting time (sec) for reading. None waits forever.
+        write_timeout: Optional[float] = None
+            Waiting time (sec) for writing. None waits forever.
+        """
+        from serial import Serial  # type: ignore
+        self.__conn = Serial(port,
+                             baudrate,
+                             timeout=timeout,
+                             write_timeout=write_timeout)
+        self.__timeout = timeout
+        self.__write_timeout = write_timeout
+        # read and write the file descriptor directly where possible
+        self.__fd: Optional[int] = getattr(self.__conn, "fd", None)
+        self.__abort: Optional[int] = getattr(self.__conn,
+                                              "pipe_abort_read_r", None)
+
+    @property
+    def serial(self) -> Any:
+        """Underlying `serial.Serial`"""
+        return self.__conn
+
+    def readinto(self, buf: Buffer) -> int:
+        if self.__fd is None:
+            return self.__conn.readinto(buf)
+        view = memoryview(buf).cast("B")
+        size = len(view)
+        n = 0
+        deadline = None if self.__timeout is None \
+            else monotonic() + self.__timeout
+        fds = [self.__fd] if self.__abort is None \
+            else [self.__fd, self.__abort]
+        while n < size:
+            wait = None if deadline is None \
+                else max(deadline - monotonic(), 0.)
+            ready, _, _ = select.select(fds, [], [], wait)
+            if self.__abort in ready:
+                os.read(self.__abort, 1000)
+                break
+            if len(ready) == 0:
+                break
+            received = os.readv(self.__fd, [view[n:]])
+            if received == 0:
+                # the device is disconnected
+                from serial import SerialException  # type: ignore
+                raise SerialException(
+                    "device reports readiness to read but returned no "
+                    "data (device disconnected or multiple access on "
+                    "port?)")
+            n += received
+        return n
+
+    def readline(self) -> bytes:
+        return self.__conn.readline()
+
+    def write(self, data: Buffer) -> int:
+        return self.__conn.write(data)
+
+    def writev(self, bufs: Sequence[Buffer]) -> int:
+        if self.__fd is None or not hasattr(os, "writev"):
+            return self.__conn.write(b"".join(bufs))
+        views = [memoryview(b).cast("B") for b in bufs]
+        total = sum(len(v) for v in views)
+        sent = 0
+        deadline = None if self.__write_timeout is None \
+            else monotonic() + self.__write_timeout
+        while sent < total:
+            try:
+                n = os.writev(self.__fd, views)
+            except BlockingIOError:
+                # the fd is non-blocking and the output buffer is full
+                n = 0
+            sent += n
+            # drop buffers already written
+            while n > 0 and len(views) > 0:
+                if n >= len(views[0]):
+                    n -= len(views[0])
+                    views.pop(0)
+                else:
+                    views[0] = views[0][n:]
+                    n = 0
+            if sent < total:
+                wait = None if deadline is None \
+                    else max(deadline - monotonic(), 0.)
+                _, ready, _ = select.select([], [self.__fd], [], wait)
+                if len(ready) == 0:
+                    from serial import SerialTimeoutException  # type: ignore
+                    raise SerialTimeoutException("Write timeout")
+        return total
+
+    @property
+    def in_waiting(self) -> int:
+        return self.__conn.in_waiting
+
+    def reset_input_buffer(self) -> None:
+        self.__conn.reset_input_buffer()
+
+    def reset_output_buffer(self) -> None:
+        self.__conn.reset_output_buffer()
+
+    def cancel_read(self) -> None:
+        self.__conn.cancel_read()
+
+    def close(self) -> None:
+        self.__conn.close()
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Split "host:port" (or "socket://host:port") into host and port"""
+    if address.startswith("socket://"):
+        address = address[len("socket://"):]
+    host, _, port = address.rpartition(":")
+    if host == "" or not port.isdigit():
+        raise ValueError(f"{address} is not host:port.")
+    return host.strip("[]"), int(port)
+
+
+class TcpTransport(Transport):
+    """Transport over TCP to a serial bridge (e.g. ser2net)"""
+    chunk = 4096
+
+    def __init__(self, address: str, timeout: Optional[float]):
+        """Instantiate TcpTransport
+
+        Parameters
+        ----------
+        address: str
+            "host:port" of the bridge.
+        timeout: Optional[float]
+            Waiting time (sec) for reading. None waits forever.
+        """
+        host, port = parse_address(address)
+        self.__sock = socket.create_connection((host, port))
+        self.__sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__timeout = timeout
+        self.__rx = bytearray()
+        self.__chunk = bytearray(self.chunk)
+        self.__eof = False
+        self.__wake_r, self.__wake_w = socket.socketpair()
+
+    def __wait(self, deadline: Optional[float]) -> bool:
+        wait = None if deadline is None else max(deadline - monotonic(), 0.)
+        ready, _, _ = select.select([self.__sock, self.__wake_r], [], [],
+                                    wait)
+        if self.__wake_r in ready:
+            self.__wake_r.recv(self.chunk)
+            return False
+        return len(ready) > 0
+
+    def __deadline(self) -> Optional[float]:
+        if self.__timeout is None:
+            return None
+        return monotonic() + self.__timeout
+
+    def __closed(self) -> ConnectionError:
+        return ConnectionError("the bridge closed the connection.")
+
+    def __receive(self) -> bool:
+        # move received bytes into the buffer. False at end of stream
+        received = self.__sock.recv_into(self.__chunk)
+        if received == 0:
+            self.__eof = True
+            return False
+        self.__rx += memoryview(self.__chunk)[:received]
+        return True
+
+    def readinto(self, buf: Buffer) -> int:
+        view = memoryview(buf).cast("B")
+        n = min(len(self.__rx), len(view))
+        if n > 0:
+            view[:n] = self.__rx[:n]
+            del self.__rx[:n]
+        if n == len(view):
+            return n
+        if self.__eof:
+            if n > 0:
+                return n
+            raise self.__closed()
+        deadline = self.__deadline()
+        while n < len(view) and self.__wait(deadline):
+            received = self.__sock.recv_into(view[n:])
+            if received == 0:
+                self.__eof = True
+                if n > 0:
+                    # bytes read are returned and the next read raises
+                    break
+                raise self.__closed()
+            n += received
+        return n
+
+    def readline(self) -> bytes:
+        deadline = self.__deadline()
+        start = 0
+        while True:
+            end = self.__rx.find(b"\n", start)
+            if end >= 0:
+                line = bytes(self.__rx[:end + 1])
+                del self.__rx[:end + 1]
+                return line
+            start = len(self.__rx)
+            if self.__eof or not self.__wait(deadline):
+                break
+            if not self.__receive():
+                break
+        if self.__eof and len(self.__rx) == 0:
+            raise self.__closed()
+        line = bytes(self.__rx)
+        self.__rx.clear()
+        return line
+
+    def write(self, data: Buffer) -> int:
+        self.__sock.sendall(data)
+        return len(data)
+
+    def writev(self, bufs: Sequence[Buffer]) -> int:
+        if not hasattr(self.__sock, "sendmsg"):
+            return self.write(b"".join(bufs))
+        views = [memoryview(b).cast("B") for b in bufs]
+        total = sum(len(v) for v in views)
+        sent = 0
+        while sent < total:
+            n = self.__sock.sendmsg(views)
+            sent += n
+            while n > 0 and len(views) > 0:
+                if n >= len(views[0]):
+                    n -= len(views[0])
+                    views.pop(0)
+                else:
+                    views[0] = views[0][n:]
+                    n = 0
+        return total
+
+    @property
+    def in_waiting(self) -> int:
+        # move everything received into the buffer without blocking, so
+        # that the count is exact and a read of it does not wait
+        while not self.__eof \
+                and select.select([self.__sock], [], [], 0.)[0]:
+            if not self.__receive():
+                break
+        if self.__eof and len(self.__rx) == 0:
+            raise self.__closed()
+        return len(self.__rx)
+
+    def reset_input_buffer(self) -> None:
+        self.__rx.clear()
+        if self.__sock.fileno() < 0:
+            return None
+        while not self.__eof \
+                and select.select([self.__sock], [], [], 0.)[0]:
+            if self.__sock.recv_into(self.__chunk) == 0:
+                self.__eof = True
+
+    def cancel_read(self) -> None:
+        self.__wake_w.send(b"\x00")
+
+    def close(self) -> None:
+        self.__sock.close()
+        self.__wake_r.close()
+        self.__wake_w.close()
+
+
+class _Pipe(object):
+    """One direction of an in-memory byte stream"""
+    def __init__(self):
+        self.data = bytearray()
+        self.cond = threading.Condition()
+        self.cancelled = False
+
+
+class LoopbackTransport(Transport):
+    """In-memory transport
+
+    Bytes written are read back from the same transport unless it is
+    created by `pair`, whose two ends read what the other writes.
+    """
+    def __init__(self,
+                 timeout: Optional[float] = None,
+                 rx: Optional[_Pipe] = None,
+                 tx: Optional[_Pipe] = None):
+        self.__timeout = timeout
+        self.__rx = rx if rx is not None else _Pipe()
+        self.__tx = tx if tx is not None else self.__rx
+
+    @staticmethod
+    def pair(
+        timeout: Optional[float] = None
+    ) -> Tuple['LoopbackTransport', 'LoopbackTransport']:
+        """Create two transports connected to each other"""
+        a, b = _Pipe(), _Pipe()
+        return (LoopbackTransport(timeout, a, b),
+                LoopbackTransport(timeout, b, a))
+
+    def __wait(self, ready: Any) -> bool:
+        pipe = self.__rx
+        deadline = None if self.__timeout is None \
+            else monotonic() + self.__timeout
+        while not ready():
+            if pipe.cancelled:
+                pipe.cancelled = False
+                return False
+            wait = None if deadline is None else deadline - monotonic()
+            if wait is not None and wait <= 0.:
+                return False
+            pipe.cond.wait(wait)
+        return True
+
+    def readinto(self, buf: Buffer) -> int:
+        view = memoryview(buf).cast("B")
+        pipe = self.__rx
+        with pipe.cond:
+            self.__wait(lambda: len(pipe.data) >= len(view))
+            n = min(len(pipe.data), len(view))
+            view[:n] = pipe.data[:n]
+            del pipe.data[:n]
+        return n
+
+    def readline(self) -> bytes:
+        pipe = self.__rx
+        with pipe.cond:
+            self.__wait(lambda: pipe.data.find(b"\n") >= 0)
+            end = pipe.data.find(b"\n")
+            n = len(pipe.data) if end < 0 else end + 1
+            line = bytes(pipe.data[:n])
+            del pipe.data[:n]
+        return line
+
+    def write(self, data: Buffer) -> int:
+        return self.writev([data])
+
+    def writev(self, bufs: Sequence[Buffer]) -> int:
+        pipe = self.__tx
+        n = 0
+        with pipe.cond:
+            for b in bufs:
+                pipe.data += b
+                n += len(b)
+            pipe.cond.notify_all()
+        return n
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.__rx.data)
+
+    def reset_input_buffer(self) -> None:
+        with self.__rx.cond:
+            self.__rx.data.clear()
+
+    def cancel_read(self) -> None:
+        with self.__rx.cond:
+            self.__rx.cancelled = True
+            self.__rx.cond.notify_all()
+
+
+def open_transport(kind: str, port: Optional[str], baudrate: int,
+                   timeout: Optional[float]) -> Transport:
+    """Open a transport.
+
+    Parameters
+    ----------
+    kind: str
+        "serial", "tcp" or "loopback".
+    port: Optional[str]
+        Serial port for "serial" and "host:port" for "tcp".
+    baudrate: int
+        Baudrate of the serial port. Ignored except by "serial".
+    timeout: Optional[float]
+        Waiting time (sec) for reading.
+
+    Returns
+    -------
+    transport: Transport
+    """
+    if kind == "serial":
+        return SerialTransport(port, baudrate, timeout)
+    if kind == "tcp":
+        if port is None:
+            raise ValueError("Port is not specified.")
+        return TcpTransport(port, timeout)
+    if kind == "loopback":
+        return LoopbackTransport(timeout)
+    raise ValueError(f"{kind} is not available as transport.")
@@ -1,12 +1,18 @@
 import argparse as ap
-from typing import List
+from typing import List, Optional
 
 from pino.config import Config
 
 
 class PinoCli(object):
+    commands = ["record"]
+
     def __init__(self):
         self.__parser = ap.ArgumentParser(description="About this program")
+        self.__parser.add_argument("command",
+                                   help="Command to run (record)",
+                                   nargs="?",
+                                   choices=self.commands)
         self.__parser.add_argument("--yaml",
                                    "-y",
                                    help="About this argument",
@@ -39,8 +45,24 @@ class PinoCli(object):
                                    "-a",
                                    help="About this argument",
                                    type=str)
+        self.__parser.add_argument("--output",
+                                   "-o",
+                                   help="Path to the log file to record into",
+                                   type=str)
+        self.__parser.add_argument("--duration",
+                                   help="Recording time (sec)",
+                                   type=float)
+        self.__parser.add_argument("--deploy",
+                                   help="Write the sketch before connecting",
+                                   action="store_true")
         self.__args = self.__parser.parse_args()
 
+    def get_command(self) -> Optional[str]:
+        return self.__args.command
+
+    def get_yaml(self) -> Optional[str]:
+        return self.__args.yaml
+
     def get_config(self) -> Config:
         yml = self.__args.yaml
         return Config(yml)
@@ -68,6 +90,56 @@ class PinoCli(object):
     def get_arduino(self) -> str:
         return self.__args.arduino
 
+    def get_output(self) -> str:
+        return self.__args.output
+
+    def get_duration(self) -> Optional[float]:
+        return self.__args.duration
+
+    def get_deploy(self) -> bool:
+        return self.__args.deploy
+
+
+def record(cli: PinoCli) -> int:
+    """Connect to a board configured by the yaml file and record events"""
+    from pino.ino import Arduino, Comport
+    from pino.record import LogWriter, Recorder
+
+    if cli.get_yaml() is None:
+        raise ValueError("`record` requires --yaml.")
+    if cli.get_output() is None:
+        raise ValueError("`record` requires --output.")
+    config = cli.get_config()
+    setting = config.comport
+    for k, v in [("port", cli.get_port()), ("baudrate", cli.get_baudrate()),
+                 ("timeout", cli.get_timeout()), ("warmup", cli.get_warmup()),
+                 ("arduino", cli.get_arduino()),
+                 ("sketch", cli.get_dotino())]:
+        if v is not None:
+            setting[k] = v
+    # reading must time out to stop recording
+    if setting.get("timeout") is None:
+        setting["timeout"] = 1.
+    com = Comport.derive(setting)
+    if cli.get_deploy():
+        com.deploy()
+    com.connect()
+    ino = Arduino(com)
+    if "PinMode" in config:
+        ino.apply_pinmode_settings(config.pinmode)
+    with LogWriter(cli.get_output()) as writer:
+        n = Recorder(ino, writer).run(cli.get_duration())
+    ino.disconnect()
+    print(f"{n} records in {cli.get_output()}")
+    return 0
+
+
+def main() -> int:
+    cli = PinoCli()
+    if cli.get_command() == "record":
+        return record(cli)
+    return 0
+
 
 if __name__ == '__main__':
-    PinoCli().get_configs()
+    main()
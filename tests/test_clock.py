@@ -0,0 +1,64 @@
+import pytest
+
+from pino.clock import WRAP, ClockSync
+
+
+class _Board(object):
+    """Board whose clock runs `drift` faster than the host clock"""
+    def __init__(self, host: "_Host", start_us: int, drift: float):
+        self.host = host
+        self.start_us = start_us
+        self.drift = drift
+        self.lost = 0
+
+    def board_micros(self) -> int:
+        if self.lost > 0:
+            self.lost -= 1
+            raise TimeoutError
+        # the board reads its clock in the middle of the round trip
+        self.host.now += 0.0005
+        t = self.start_us + self.host.now * 1e6 * (1 + self.drift)
+        self.host.now += 0.0005
+        return int(t) % WRAP
+
+
+class _Host(object):
+    def __init__(self):
+        self.now = 100.
+        self.step = 0.
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def wall(self) -> float:
+        return 1.6e9 + self.now + self.step
+
+
+def test_wall_clock_step_does_not_corrupt_fit():
+    host = _Host()
+    board = _Board(host, WRAP - 5000000, 50e-6)
+    sync = ClockSync(board, clock=host.monotonic, wall=host.wall)
+    for _ in range(10):
+        sync.sync()
+        host.now += 10.
+    host.step = 3600.
+    for _ in range(10):
+        sync.sync()
+        host.now += 10.
+    assert sync.drift == pytest.approx(-50e-6 / (1 + 50e-6), abs=1e-8)
+    t = board.board_micros()
+    converted, err = sync.board_to_host(t)
+    assert converted == pytest.approx(host.wall() - 0.0005, abs=1e-5)
+    assert sync.host_to_board(converted) == pytest.approx(t, abs=10)
+
+
+def test_lost_pings_are_skipped():
+    host = _Host()
+    board = _Board(host, 0, 0.)
+    sync = ClockSync(board, burst=4, clock=host.monotonic, wall=host.wall)
+    board.lost = 4
+    sync.sync()
+    assert not sync.synced
+    board.lost = 2
+    sync.sync()
+    assert sync.synced
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from pino.config import ComportSetting, Config, PinModeSetting, load_yaml
+
+DOCUMENT = "Comport:\n  port: /dev/ttyACM0\nPinMode:\n  13: OUTPUT\n"
+
+
+@pytest.fixture
+def yaml_path(tmp_path, monkeypatch) -> str:
+    monkeypatch.setenv("PINO_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "config.yaml"
+    path.write_text(DOCUMENT)
+    return str(path)
+
+
+def _cached_files():
+    d = os.environ["PINO_CACHE_DIR"]
+    return [os.path.join(d, f) for f in os.listdir(d)]
+
+
+def test_cache_round_trips_int_keys(yaml_path):
+    expected = {"Comport": {"port": "/dev/ttyACM0"}, "PinMode": {13: "OUTPUT"}}
+    assert load_yaml(yaml_path) == expected
+    assert load_yaml(yaml_path) == expected
+    assert len(_cached_files()) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_cache_is_private(yaml_path):
+    load_yaml(yaml_path)
+    assert os.stat(os.environ["PINO_CACHE_DIR"]).st_mode & 0o077 == 0
+    cached, = _cached_files()
+    assert os.stat(cached).st_mode & 0o077 == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_writable_cache_is_ignored(yaml_path):
+    load_yaml(yaml_path)
+    cached, = _cached_files()
+    with open(cached, "r+b") as f:
+        f.write(b"\x00" * 8)
+    os.chmod(cached, 0o666)
+    assert load_yaml(yaml_path)["PinMode"] == {13: "OUTPUT"}
+
+
+def test_document_marshal_can_not_store_is_parsed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PINO_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "dated.yaml"
+    path.write_text("Metadata:\n  date: 2020-01-01\n")
+    assert str(load_yaml(str(path))["Metadata"]["date"]) == "2020-01-01"
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_settings_are_copies(yaml_path):
+    config = Config(yaml_path)
+    config.comport["port"] = "/dev/ttyUSB0"
+    config.pinmode[2] = "INPUT"
+    assert config.comport["port"] == "/dev/ttyACM0"
+    assert config.pinmode == {13: "OUTPUT"}
+    assert isinstance(config.comport, ComportSetting)
+    assert isinstance(config.pinmode, PinModeSetting)
+
+
+def test_settings_follow_section_changes(yaml_path):
+    config = Config(yaml_path)
+    assert config.comport["port"] == "/dev/ttyACM0"
+    config["Comport"]["port"] = "/dev/ttyUSB0"
+    assert config.comport["port"] == "/dev/ttyUSB0"
+    config["PinMode"].pop(13)
+    assert config.pinmode == {}
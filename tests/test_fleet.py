@@ -0,0 +1,78 @@
+import gc
+import socket
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from queue import Queue
+from time import monotonic, sleep
+from typing import Callable
+
+import numpy as np
+
+from pino.fleet import FAILED, RUNNING, STATE_DTYPE, STOPPED, BoardSpec, \
+    _work
+
+
+def _wait(condition: Callable[[], bool], timeout: float = 2.) -> bool:
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+    return True
+
+
+def test_worker_keeps_tcp_board_connected():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    host, port = server.getsockname()
+    spec = BoardSpec({"transport": "tcp", "port": f"{host}:{port}"})
+    shm = SharedMemory(create=True, size=STATE_DTYPE.itemsize)
+    table = np.ndarray((1, ), dtype=STATE_DTYPE, buffer=shm.buf)
+    table[:] = np.zeros(1, dtype=STATE_DTYPE)
+    commands: Queue = Queue()
+    worker = threading.Thread(target=_work,
+                              args=(0, [spec], shm.name, 1, commands, 0.001,
+                                    0.2))
+    worker.start()
+    peer, _ = server.accept()
+    server.close()
+    try:
+        assert _wait(lambda: table["status"][0] != 0)
+        # the port must stay open after temporaries are collected
+        gc.collect()
+        peer.sendall(b"-3\r\nc,2,5,")
+        sleep(0.05)
+        peer.sendall(b"1000000\r\n")
+        assert _wait(lambda: table["events"][0, 2] == 5)
+        assert table["status"][0] == RUNNING, table["error"][0]
+        assert table["state"][0, 3] == 1
+        assert table["events"][0, 3] == 1
+    finally:
+        commands.put(None)
+        worker.join(5.)
+        peer.close()
+    assert table["status"][0] == STOPPED
+    del table
+    shm.close()
+    shm.unlink()
+
+
+def test_worker_reports_a_failed_board():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    _, port = server.getsockname()
+    # nothing listens on the port
+    server.close()
+    spec = BoardSpec({"transport": "tcp", "port": f"127.0.0.1:{port}"})
+    shm = SharedMemory(create=True, size=STATE_DTYPE.itemsize)
+    table = np.ndarray((1, ), dtype=STATE_DTYPE, buffer=shm.buf)
+    table[:] = np.zeros(1, dtype=STATE_DTYPE)
+    commands: Queue = Queue()
+    commands.put(None)
+    _work(0, [spec], shm.name, 1, commands, 0.001, 0.2)
+    assert table["status"][0] == FAILED
+    assert table["error"][0].startswith(b"ConnectionRefusedError")
+    del table
+    shm.close()
+    shm.unlink()
@@ -0,0 +1,179 @@
+import socket
+import threading
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+import pytest
+
+from pino.ino import HIGH, LOW, Arduino
+from pino.transport import LoopbackTransport, TcpTransport
+
+
+@pytest.fixture
+def bridge() -> Iterator[Tuple[TcpTransport, socket.socket]]:
+    """TcpTransport connected to a socket standing for a serial bridge"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    host, port = server.getsockname()
+    transport = TcpTransport(f"{host}:{port}", timeout=0.2)
+    peer, _ = server.accept()
+    server.close()
+    yield transport, peer
+    transport.close()
+    peer.close()
+
+
+def test_tcp_readinto(bridge):
+    transport, peer = bridge
+    peer.sendall(b"\x01\x02\x03\x04")
+    buf = bytearray(4)
+    assert transport.readinto(buf) == 4
+    assert buf == b"\x01\x02\x03\x04"
+
+
+def test_tcp_readinto_timeout(bridge):
+    transport, peer = bridge
+    peer.sendall(b"\x01\x02")
+    buf = bytearray(4)
+    start = monotonic()
+    assert transport.readinto(buf) == 2
+    assert monotonic() - start >= 0.15
+    assert buf[:2] == b"\x01\x02"
+
+
+def test_tcp_readline_joins_partial_lines(bridge):
+    transport, peer = bridge
+
+    def send() -> None:
+        peer.sendall(b"f,13,")
+        sleep(0.05)
+        peer.sendall(b"123456\r\n-3\r\n")
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    assert transport.readline() == b"f,13,123456\r\n"
+    # the rest of the chunk is kept for the next line
+    assert transport.readline() == b"-3\r\n"
+    sender.join()
+
+
+def test_tcp_readline_timeout(bridge):
+    transport, peer = bridge
+    peer.sendall(b"12")
+    assert transport.readline() == b"12"
+    assert transport.readline() == b""
+
+
+def test_tcp_writev(bridge):
+    transport, peer = bridge
+    assert transport.writev([b"\x22", memoryview(b"\x00"), bytearray(2)]) \
+        == 4
+    received = b""
+    while len(received) < 4:
+        received += peer.recv(4)
+    assert received == b"\x22\x00\x00\x00"
+
+
+def test_tcp_cancel_read(bridge):
+    transport, _ = bridge
+    result: Dict[str, Any] = {}
+
+    def read() -> None:
+        start = monotonic()
+        result["line"] = transport.readline()
+        result["elapsed"] = monotonic() - start
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    sleep(0.02)
+    transport.cancel_read()
+    reader.join()
+    assert result["line"] == b""
+    assert result["elapsed"] < 0.15
+
+
+def test_tcp_in_waiting_counts_all_received_bytes(bridge):
+    transport, peer = bridge
+    peer.sendall(b"-3\r\n" * 100)
+    sleep(0.05)
+    assert transport.in_waiting == 400
+    assert len(transport.read(400)) == 400
+    assert transport.in_waiting == 0
+
+
+def test_tcp_eof_raises(bridge):
+    transport, peer = bridge
+    peer.sendall(b"-3\r\n12")
+    peer.close()
+    sleep(0.05)
+    assert transport.in_waiting == 6
+    assert transport.readline() == b"-3\r\n"
+    # a partial line before the end of stream is still returned
+    assert transport.readline() == b"12"
+    start = monotonic()
+    with pytest.raises(ConnectionError):
+        transport.readline()
+    with pytest.raises(ConnectionError):
+        transport.readinto(bytearray(4))
+    with pytest.raises(ConnectionError):
+        transport.in_waiting
+    # without waiting for the timeout
+    assert monotonic() - start < 0.1
+
+
+def test_tcp_readinto_returns_bytes_before_eof(bridge):
+    transport, peer = bridge
+    peer.sendall(b"\x01\x02")
+    peer.close()
+    buf = bytearray(4)
+    assert transport.readinto(buf) == 2
+    with pytest.raises(ConnectionError):
+        transport.readinto(buf)
+
+
+class _Comport(object):
+    """Stand-in for a connected `Comport`"""
+    def __init__(self, connection: LoopbackTransport):
+        self.connection = connection
+        self.metrics = None
+
+
+def _run_board(end: LoopbackTransport,
+               reply: Callable[[bytes], bytes]) -> threading.Thread:
+    # answer each 2-byte command until the host stops writing
+    def serve() -> None:
+        while True:
+            command = end.read(2)
+            if len(command) < 2:
+                return None
+            end.write(reply(command))
+
+    board = threading.Thread(target=serve, daemon=True)
+    board.start()
+    return board
+
+
+def test_loopback_digital_read():
+    host, board = LoopbackTransport.pair(timeout=0.2)
+    states = {2: b"\x00", 3: b"\x01"}
+    _run_board(board, lambda command: states[command[1]])
+    ino = Arduino(_Comport(host))
+    assert ino.digital_read(2) == LOW
+    assert ino.digital_read(3) == HIGH
+
+
+def test_loopback_board_micros():
+    host, board = LoopbackTransport.pair(timeout=0.2)
+    t = 0xfffffff0
+    _run_board(board, lambda command: t.to_bytes(4, "little"))
+    ino = Arduino(_Comport(host))
+    assert ino.board_micros() == t
+
+
+def test_loopback_board_micros_short_reply():
+    host, board = LoopbackTransport.pair(timeout=0.05)
+    _run_board(board, lambda command: b"\x01\x02")
+    ino = Arduino(_Comport(host))
+    with pytest.raises(TimeoutError):
+        ino.board_micros()